@@ -0,0 +1,53 @@
+import re
+
+# Colloquial and South Asian names -> catalog terms they stand for. A product matches a
+# term when every word of the term is one of its name tokens; an alias matches the union.
+ALIASES = {
+    "paya": ["lamb feet"],
+    "paye": ["lamb feet"],
+    "trotters": ["feet"],
+    "nihari": ["mutton shanks", "lamb shanks"],
+    "kaleji": ["liver"],
+    "qeema": ["mince"],
+    "keema": ["mince"],
+    "boti": ["boneless", "diced", "cubes"],
+    "kapoorae": ["testicles"],
+    "gurda": ["kidneys"],
+    "dil": ["hearts"],
+    "maghaz": ["brain"],
+    "bheja": ["brain"],
+    "ojhri": ["tripe"],
+    "zaban": ["tongue"],
+    "raan": ["leg"],
+    "chaap": ["chops"],
+    "gosht": ["mutton"],
+    "murgh": ["chicken"],
+    "murgi": ["chicken"],
+    "bakra": ["goat"],
+    "offal": ["liver", "kidneys", "hearts", "tripe", "brain", "tongue"],
+}
+
+# Spelling variants that transliteration produces for the same sound, applied in order
+TRANSLITERATIONS = (
+    ("aa", "a"), ("ee", "i"), ("oo", "u"), ("kh", "k"), ("gh", "g"), ("th", "t"), ("dh", "d"),
+    ("bh", "b"), ("ph", "f"), ("q", "k"), ("w", "v"), ("y", "i"), ("e", "i"), ("o", "u"),
+)
+# Dropped before alias lookup so "do you have kaleji" resolves like "kaleji"
+QUERY_FILLER = {
+    "you", "have", "sell", "any", "got", "some", "the", "need", "want", "please", "pls",
+    "for", "your", "buy", "get", "can", "stock", "there",
+}
+DOUBLE_RE = re.compile(r"(.)\1+")
+MIN_KEY = 3
+
+
+def sound_key(word):
+    """Collapses transliteration variants: qeema/keema/kima, nihari/niharri/nehari, paya/paye."""
+    key = word.lower()
+    for variant, canonical in TRANSLITERATIONS:
+        key = key.replace(variant, canonical)
+    key = DOUBLE_RE.sub(r"\1", key)
+    # Final vowels are the least stable part of a transliteration (kaleji/kaleja, kapoorae/kapura)
+    while len(key) > MIN_KEY and key[-1] in "aiu":
+        key = key[:-1]
+    return key
@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1000))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 6 * 3600))
+
+WORD_RE = re.compile(r"[a-z0-9£]+")
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "be", "do", "does", "did", "you", "your", "u",
+    "ur", "i", "me", "my", "we", "our", "to", "of", "for", "in", "on", "at", "and", "or",
+    "can", "could", "would", "please", "pls", "plz", "hi", "hello", "hey", "thanks", "ok",
+    "any", "there", "have", "has", "with", "what", "whats", "so", "just", "also",
+}
+# Words that only make sense against earlier turns ("how much is it?", "and the other one")
+REFERENTIAL = {
+    "it", "its", "that", "this", "these", "those", "them", "they", "one", "ones", "more",
+    "same", "else", "again", "other", "another", "yes", "no", "which",
+}
+
+
+def words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def normalize_question(text):
+    return " ".join(sorted({w for w in words(text) if w not in STOPWORDS}))
+
+
+def depends_on_history(message, history):
+    if not history:
+        return False
+    tokens = words(message)
+    content = [w for w in tokens if w not in STOPWORDS]
+    return len(content) < 2 or any(w in REFERENTIAL for w in tokens)
+
+
+class AnswerCache:
+    """Size-bounded LRU of LLM answers with a per-entry TTL."""
+
+    def __init__(self, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.skips = self.evictions = 0
+
+    def key(self, message, version):
+        normalized = normalize_question(message)
+        return (normalized, version) if normalized else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, answer):
+        with self.lock:
+            self.entries[key] = (answer, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def skip(self):
+        with self.lock:
+            self.skips += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skips": self.skips,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,149 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger("TariqBot.replies")
+
+ASYNC_REPLIES = os.getenv("ASYNC_REPLIES", "0") == "1"
+REPLY_WORKERS = int(os.getenv("REPLY_WORKERS", 4))
+REPLY_QUEUE_SIZE = int(os.getenv("REPLY_QUEUE_SIZE", 100))
+REPLY_DEADLINE = float(os.getenv("REPLY_DEADLINE", 30))
+OUTBOUND_SENDER = os.getenv("OUTBOUND_SENDER", "twilio")  # "twilio", "log" or "stub"
+
+
+class TwilioSender:
+    def __init__(self, account_sid=None, auth_token=None):
+        from twilio.rest import Client
+        self.client = Client(
+            account_sid or os.getenv("TWILIO_ACCOUNT_SID"),
+            auth_token or os.getenv("TWILIO_AUTH_TOKEN"),
+        )
+
+    def send(self, to, body, from_=None):
+        self.client.messages.create(to=to, from_=from_ or os.getenv("TWILIO_WHATSAPP_FROM"), body=body)
+
+
+class LogSender:
+    def send(self, to, body, from_=None):
+        logger.info(f"Outbound to {to}: {body}")
+
+
+class StubSender:
+    """Keeps outbound messages in memory so they can be inspected locally."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to, body, from_=None):
+        self.sent.append({"to": to, "from": from_, "body": body})
+
+
+SENDERS = {"twilio": TwilioSender, "log": LogSender, "stub": StubSender}
+
+
+def make_sender(kind=OUTBOUND_SENDER):
+    return SENDERS[kind]()
+
+
+class ReplyWorkerPool:
+    """Bounded queue drained by a fixed set of threads; handler(job, remaining_seconds) -> reply text.
+
+    The webhook has already returned an empty reply, so a job that expires or fails is answered
+    with fallback(job, reason) instead of leaving the customer with nothing.
+    """
+
+    def __init__(self, handler, sender, fallback=None, workers=REPLY_WORKERS,
+                 queue_size=REPLY_QUEUE_SIZE, deadline=REPLY_DEADLINE):
+        self.handler = handler
+        self.sender = sender
+        self.fallback = fallback
+        self.workers = workers
+        self.deadline = deadline
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.counts = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "expired": 0,
+                       "fallbacks": 0}
+        self.active = 0
+        self.threads = []
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"reply-worker-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def submit(self, job):
+        self.start()
+        job["enqueued"] = time.monotonic()
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("submitted")
+        return True
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self._process(job)
+            finally:
+                self.jobs.task_done()
+
+    def _process(self, job):
+        remaining = self.deadline - (time.monotonic() - job["enqueued"])
+        if remaining <= 0:
+            logger.warning(f"Reply to {job['to']} waited past {self.deadline}s deadline, sending fallback")
+            self._count("expired")
+            self._send_fallback(job, "expired")
+            return
+        with self.lock:
+            self.active += 1
+        try:
+            reply = self.handler(job, remaining)
+            # Empty when the handler already sent everything itself (streamed first chunk)
+            if reply:
+                self.sender.send(job["to"], reply, from_=job.get("from"))
+            self._count("completed")
+        except Exception:
+            logger.exception(f"Reply job for {job['to']} failed")
+            self._count("failed")
+            self._send_fallback(job, "failed")
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def _send_fallback(self, job, reason):
+        if self.fallback is None:
+            return
+        try:
+            reply = self.fallback(job, reason)
+            if reply:
+                self.sender.send(job["to"], reply, from_=job.get("from"))
+                self._count("fallbacks")
+        except Exception:
+            logger.exception(f"Fallback reply to {job['to']} failed")
+
+    def join(self):
+        self.jobs.join()
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counts,
+                queued=self.jobs.qsize(),
+                capacity=self.jobs.maxsize,
+                workers=self.workers,
+                active=self.active,
+                deadline=self.deadline,
+            )
@@ -0,0 +1,197 @@
+import re
+
+from rapidfuzz import fuzz
+
+from catalog_index import tokenize
+from catalog_model import format_pence, parse_price
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+MAX_QUANTITY = 50
+MAX_ITEMS = 10
+# Longer mentions are sentences, not basket lines
+MAX_MENTION_WORDS = 5
+# A one-word mention naming more products than this ("lamb", "chicken") is browsing, not a basket line
+MAX_AMBIGUOUS = 3
+# Share of the matched product's name words the mention must cover ("chicken" -> "Baby Chicken" is half)
+MIN_NAME_COVERAGE = 0.5
+WORD_CUTOFF = 80
+# Hits this close to the best one make the mention ambiguous ("lamb chops": three marinated chops tie)
+TIE_MARGIN = 2
+MAX_OPTIONS = 3
+FREE_DELIVERY_PENCE = 10000
+DELIVERY_FEE_PENCE = 999
+
+SPLIT_RE = re.compile(r"\s*(?:,|;|&|\+|\n|\band\b|\bplus\b)\s*")
+LEAD_RE = re.compile(
+    r"^(?:(?:whats|what is|what are|how much(?: is| are| for| would)?|prices? (?:of|for)|cost (?:of|for)|"
+    r"total (?:of|for)|id like|i would like|i want|i need|can i (?:get|have|order)|get me|give me|"
+    r"order|please|pls)\s+)+"
+)
+TRAIL_RE = re.compile(r"\s+(?:please|pls|thanks|each|cost|be|come to|altogether|in total)$")
+QTY_LEAD_RE = re.compile(r"^(?P<qty>\d+|" + "|".join(NUMBER_WORDS) + r")\s*(?:x|×|packs? of|packs?|pcs|of)?\s+(?P<item>.+)$")
+QTY_TRAIL_RE = re.compile(r"^(?P<item>.+?)\s*(?:x|×)\s*(?P<qty>\d+)$")
+# "Orders under £100: £9.99 delivery fee." / "Orders £100+: Free delivery."
+FREE_DELIVERY_RE = re.compile(r"£\s*([0-9]+(?:\.[0-9]{2})?)\s*\+?\s*:?\s*free delivery", re.I)
+DELIVERY_FEE_RE = re.compile(r"£\s*([0-9]+(?:\.[0-9]{2})?)\s*delivery fee", re.I)
+
+
+def parse_delivery_policy(policy):
+    """(free_delivery_threshold_pence, fee_pence) from the store's delivery_policy text."""
+    free = FREE_DELIVERY_RE.search(policy or "")
+    fee = DELIVERY_FEE_RE.search(policy or "")
+    return (
+        parse_price(f"£{free.group(1)}")[0] if free else FREE_DELIVERY_PENCE,
+        parse_price(f"£{fee.group(1)}")[0] if fee else DELIVERY_FEE_PENCE,
+    )
+
+
+def parse_mention(text):
+    text = TRAIL_RE.sub("", LEAD_RE.sub("", text.strip())).strip()
+    for pattern in (QTY_LEAD_RE, QTY_TRAIL_RE):
+        match = pattern.match(text)
+        if match:
+            qty = match.group("qty")
+            qty = int(qty) if qty.isdigit() else NUMBER_WORDS[qty]
+            return min(max(qty, 1), MAX_QUANTITY), match.group("item").strip(), True
+    return 1, text, False
+
+
+def parse_basket(message):
+    """Splits "price of chicken breast, lamb chops and 2 boneless mutton" into (qty, item) mentions.
+
+    Returns None unless the message looks like a basket: several items, or one with a quantity.
+    """
+    text = re.sub(r"['’?!.]", "", message.lower())
+    parts = [p for p in SPLIT_RE.split(LEAD_RE.sub("", text.strip())) if p]
+    if not parts or len(parts) > MAX_ITEMS:
+        return None
+    mentions = [parse_mention(p) for p in parts]
+    if any(not item or len(item.split()) > MAX_MENTION_WORDS for _, item, _ in mentions):
+        return None
+    if len(mentions) < 2 and not mentions[0][2]:
+        return None
+    return [(qty, item) for qty, item, _ in mentions]
+
+
+class BasketLine:
+    __slots__ = ("qty", "query", "name", "price", "category", "pence", "in_stock", "options")
+
+    def __init__(self, qty, query, match=None, options=()):
+        self.qty = qty
+        self.query = query
+        self.name = self.price = self.category = self.pence = None
+        self.in_stock = False
+        self.options = list(options)  # names to ask about when the mention is ambiguous
+        if match:
+            self.name, self.price, self.category, _ = match
+            self.pence, self.in_stock = parse_price(self.price)
+
+    @property
+    def priced(self):
+        return self.in_stock and self.pence is not None
+
+
+class Basket:
+    """Resolves every mention of a basket message with one batched fuzzy pass and totals it."""
+
+    def __init__(self, fuzzy, delivery_policy="", index=None):
+        self.fuzzy = fuzzy
+        self.index = index
+        self.free_delivery, self.delivery_fee = parse_delivery_policy(delivery_policy)
+
+    def generic(self, item):
+        """True for a category or a single word shared by many products, which no basket line means."""
+        if self.index is None:
+            return False
+        if self.index.category(item):
+            return True
+        if len(item.split()) > 1 or self.index.exact(item):
+            return False
+        # Aliases ("kaleji" -> every liver) are resolved by lookup() as a "did you mean" instead
+        return len(self.index.partial(item)) > MAX_AMBIGUOUS
+
+    @staticmethod
+    def covers(item, name):
+        query_words = tokenize(item)
+        name_words = [w for w in tokenize(name) if len(w) >= 3 and w.isalpha()]
+        if not name_words:
+            return True
+        covered = sum(1 for n in name_words if any(fuzz.ratio(q, n) >= WORD_CUTOFF for q in query_words))
+        return covered / len(name_words) >= MIN_NAME_COVERAGE
+
+    def lookup(self, item):
+        """Exact names, aliases ("kalegi", "qeema") and whole catalog words ("paya") before any
+        fuzzy matching, as (match, options); None leaves the mention to the fuzzy pass."""
+        if self.index is None:
+            return None
+        exact = self.index.exact(item)
+        found = [exact] if exact else self.index.alias(item) or self.index.partial(item)
+        if not found:
+            return None
+        products = list({product['name']: (product, category) for product, category in found}.values())
+        if len(products) > 1:
+            return None, [product['name'] for product, _ in products[:MAX_OPTIONS]]
+        product, category = products[0]
+        return (product['name'], product['price'], category.title(), 100.0), []
+
+    def pick(self, item, hits):
+        hits = [hit for hit in hits if self.covers(item, hit[0])]
+        if not hits:
+            return None, []
+        ties = list(dict.fromkeys(hit[0] for hit in hits if hit[3] >= hits[0][3] - TIE_MARGIN))
+        if len(ties) > 1:
+            return None, ties[:MAX_OPTIONS]
+        return hits[0], []
+
+    def resolve(self, mentions):
+        looked_up = [self.lookup(item) for _, item in mentions]
+        # One batched fuzzy pass for whatever the dictionaries didn't settle
+        pending = [item for (_, item), found in zip(mentions, looked_up) if found is None]
+        fuzzy = iter(self.fuzzy.search_many(pending, limit=MAX_OPTIONS + 1) if pending else ())
+        lines = []
+        for (qty, item), found in zip(mentions, looked_up):
+            match, options = found if found is not None else self.pick(item, next(fuzzy))
+            lines.append(BasketLine(qty, item, match, options))
+        return lines
+
+    def answer(self, message, strict=False):
+        mentions = parse_basket(message)
+        # "beef and lamb" asks what's in two categories; leave that to the category and LLM routes
+        if not mentions or any(self.generic(item) for _, item in mentions):
+            return None
+        lines = self.resolve(mentions)
+        found = [line for line in lines if line.name or line.options]
+        # A lone item, or a question that also matched an FAQ, only counts if everything resolved;
+        # a basket of nothing but "did you mean" is left to the alias and search routes
+        if not any(line.name for line in lines) or ((len(found) < 2 or strict) and len(found) < len(lines)):
+            return None
+        return self.render(lines)
+
+    def render(self, lines):
+        out = ["🧺 Your basket:"]
+        total = 0
+        for line in lines:
+            if line.options:
+                out.append(f"• ❓ {line.query}: did you mean {', '.join(line.options[:-1])} or {line.options[-1]}?")
+            elif not line.name:
+                out.append(f"• ❓ {line.query}: not found, please check the name")
+            elif not line.priced:
+                out.append(f"• {line.name} ({line.category}): {line.price}")
+            elif line.qty > 1:
+                total += line.pence * line.qty
+                out.append(f"• {line.qty} × {line.name} ({line.category}): {line.price} each = {format_pence(line.pence * line.qty)}")
+            else:
+                total += line.pence
+                out.append(f"• {line.name} ({line.category}): {line.price}")
+        out.append(f"Total: {format_pence(total)}")
+        if total >= self.free_delivery:
+            out.append(f"🚚 Free delivery on orders over {format_pence(self.free_delivery)}.")
+        else:
+            out.append(
+                f"🚚 Add {format_pence(self.free_delivery - total)} more for free delivery "
+                f"(otherwise {format_pence(self.delivery_fee)})."
+            )
+        return "\n".join(out)
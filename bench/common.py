@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from openai import APITimeoutError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, "bench", "corpus.jsonl")
+
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "bench")
+
+
+def load_corpus(path=CORPUS):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+class FakeCompletions:
+    def __init__(self, owner, timeout=None):
+        self.owner = owner
+        self.timeout = timeout
+
+    def create(self, model, messages, **kwargs):
+        with self.owner.lock:
+            self.owner.calls += 1
+        if self.timeout is not None and self.owner.latency > self.timeout:
+            time.sleep(self.timeout)
+            raise APITimeoutError(request=None)
+        time.sleep(self.owner.latency)
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        content = f"Stub answer from {model}."
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(content) // 4,
+                total_tokens=prompt_tokens + len(content) // 4,
+            ),
+        )
+
+
+class FakeOpenAI:
+    """Drop-in for the OpenAI client that sleeps for a fixed upstream latency and honours timeouts."""
+
+    def __init__(self, latency=0.5):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=FakeCompletions(self))
+
+    def with_options(self, timeout=None, **kwargs):
+        return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(self, timeout)))
+
+
+class AlwaysValid:
+    def __init__(self, token=None):
+        pass
+
+    def validate(self, url, params, signature):
+        return True
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(c)), *(len(str(r[i])) for r in rows)) for i, c in enumerate(columns)]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,156 @@
+"""Local stand-in for the OpenAI chat completions API, streaming or not.
+
+    python bench/fake_openai.py [--port 8089] [--first-token 0.4] [--token-delay 0.02] [--words 400]
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 STREAM_REPLIES=1 python cmvprun.py
+
+Replies are a long canned answer emitted word by word, so early cutoffs and client
+timeouts behave like they do upstream. GET /stats shows how many tokens were actually
+sent and how many streams the client closed early.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SENTENCES = (
+    "All of our meat is hand slaughtered and certified halal by the HMC.",
+    "We source lamb and mutton from British farms and prepare every cut fresh in store each morning.",
+    "Chicken is delivered daily, and marinated ranges are made in small batches so they never sit for long.",
+    "If you would like a particular cut, our butchers are happy to prepare it to order at the counter.",
+    "For larger orders such as weddings or Eid we recommend calling the branch a few days ahead.",
+    "Delivery is free on orders over £100 and most London postcodes are covered the same day.",
+)
+
+
+def canned_words(count):
+    return list(itertools.islice(itertools.cycle(" ".join(SENTENCES).split()), count))
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/stats":
+            self.send_error(404)
+            return
+        with self.server.lock:
+            body = json.dumps(self.server.stats).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "gpt-4")
+        # Roughly one token per word, capped like the real API
+        words = canned_words(min(self.server.words, request.get("max_tokens") or self.server.words))
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+        self.server.count("requests")
+        time.sleep(self.server.first_token)
+        if request.get("stream"):
+            self.stream(model, words, prompt_tokens, (request.get("stream_options") or {}).get("include_usage"))
+        else:
+            self.complete(model, words, prompt_tokens)
+
+    def complete(self, model, words, prompt_tokens):
+        time.sleep(self.server.token_delay * len(words))
+        self.server.count("tokens_sent", len(words))
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                         "finish_reason": "length"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                      "total_tokens": prompt_tokens + len(words)},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, model, words, prompt_tokens, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.server.count("streams")
+
+        def event(choices, usage=None):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        try:
+            for i, word in enumerate(words):
+                event([{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}])
+                self.server.count("tokens_sent")
+                time.sleep(self.server.token_delay)
+            event([{"index": 0, "delta": {}, "finish_reason": "length"}])
+            if include_usage:
+                event([], {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                           "total_tokens": prompt_tokens + len(words)})
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: the remaining tokens are never generated
+            self.server.count("streams_closed_early")
+        self.close_connection = True
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, first_token=0.4, token_delay=0.02, words=400):
+        super().__init__(address, FakeOpenAIHandler)
+        self.first_token = first_token
+        self.token_delay = token_delay
+        self.words = words
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streams": 0, "streams_closed_early": 0, "tokens_sent": 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start(port=0, **options):
+    server = FakeOpenAIServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--first-token", type=float, default=0.4, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--words", type=int, default=400, help="length of the canned answer")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(("127.0.0.1", args.port), args.first_token, args.token_delay, args.words)
+    print(f"Fake OpenAI API on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Per-stage micro-benchmarks of the routing pipeline over the message corpus.
+
+    python bench/micro.py [--repeat 200] [--corpus bench/corpus.jsonl]
+"""
+import argparse
+import logging
+import time
+
+from common import load_corpus, print_table, summarize, CORPUS
+
+import cmvprun
+from answer_cache import normalize_question
+
+
+def fuzzy_category_page(message):
+    # The fuzzy_category route: match a category name, then serve its pre-rendered first page
+    category = cmvprun.fuzzy_category(message)
+    return cmvprun.category_reply(category) if category else None
+
+
+def stages():
+    snap = cmvprun.snapshot()
+    return {
+        "intent.classify": cmvprun.ROUTER.classify,
+        "index.category": snap.index.category,
+        "index.exact": snap.index.exact,
+        "index.substring": snap.index.substring,
+        "index.partial": snap.index.partial,
+        "index.alias": snap.index.alias,
+        "catalog.answer": snap.catalog.answer,
+        "postcode.nearest": snap.locator.nearest_to,
+        "fuzzy_category": cmvprun.fuzzy_category,
+        "fuzzy_category+page": fuzzy_category_page,
+        "fuzzy_product_search": cmvprun.fuzzy_product_search,
+        "find_products": cmvprun.find_products,
+        "prompt.full": lambda m: snap.prompt.system_prompt(m, []),
+        "prompt.retrieval": lambda m: snap.prompt.retrieval_section(m, []),
+        "answer_cache.normalize": normalize_question,
+    }
+
+
+def run(messages, repeat):
+    rows = []
+    for name, fn in stages().items():
+        samples = []
+        for _ in range(repeat):
+            for message in messages:
+                start = time.perf_counter()
+                fn(message)
+                samples.append((time.perf_counter() - start) * 1e6)
+        stats = summarize(samples)
+        rows.append((name, stats["count"], *(f"{stats[k]:.1f}" for k in ("mean", "p50", "p95", "p99", "max"))))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    messages = [row["body"].strip().lower() for row in load_corpus(args.corpus)]
+    rows = run(messages, args.repeat)
+    print_table(rows, ("stage", "calls", "mean_us", "p50_us", "p95_us", "p99_us", "max_us"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""End-to-end replay of a JSONL message corpus through the /whatsapp webhook.
+
+    python bench/replay.py [--corpus bench/corpus.jsonl] [--concurrency 8] [--repeat 5]
+                           [--llm-latency 0.5] [--fake-server] [--with-sleep] [--json]
+
+OpenAI and Twilio signature validation are stubbed; every other stage runs for real.
+With --fake-server the real OpenAI client talks to bench/fake_openai.py over HTTP,
+which is what exercises streaming (STREAM_REPLIES=1) and client timeouts end to end.
+Environment switches (ASYNC_REPLIES, PROMPT_MODE, SESSION_BACKEND, ...) apply as usual.
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from common import AlwaysValid, FakeOpenAI, load_corpus, summarize, CORPUS
+
+import cmvprun
+import fake_openai
+
+routes = threading.local()
+
+
+def instrument(llm_latency, with_sleep, fake_server=False):
+    if fake_server:
+        server = fake_openai.start(first_token=llm_latency)
+        from openai import OpenAI
+        cmvprun.client = OpenAI(api_key="bench", base_url=server.base_url, timeout=cmvprun.LLM_TIMEOUT, max_retries=0)
+        llm_stats = lambda: dict(server.stats)
+    else:
+        fake = FakeOpenAI(llm_latency)
+        cmvprun.client = fake
+        llm_stats = lambda: {"requests": fake.calls}
+    cmvprun.RequestValidator = AlwaysValid
+    if not with_sleep:
+        cmvprun.time = types.SimpleNamespace(**vars(time))
+        cmvprun.time.sleep = lambda seconds: None
+
+    find_products = cmvprun.find_products
+
+    def tracked(message, session=None):
+        reply = find_products(message, session)
+        routes.kind = "deterministic" if reply is not None else "llm"
+        return reply
+
+    cmvprun.find_products = tracked
+    return llm_stats
+
+
+def replay(rows, concurrency, repeat, senders):
+    local = threading.local()
+    sids = itertools.count()
+    jobs = [(i, row) for i, row in enumerate(rows * repeat)]
+
+    def send(job):
+        i, row = job
+        client = getattr(local, "client", None) or setattr(local, "client", cmvprun.app.test_client()) or local.client
+        routes.kind = "replayed"
+        data = {
+            "Body": row["body"],
+            "From": row.get("from") or f"whatsapp:+4470000{i % senders:05d}",
+            "To": "whatsapp:+440000000000",
+            "MessageSid": f"SMbench{next(sids)}",
+        }
+        start = time.perf_counter()
+        response = client.post("/whatsapp", data=data)
+        return time.perf_counter() - start, response.status_code, routes.kind
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, jobs))
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed, llm_stats):
+    latencies = summarize([r[0] * 1000 for r in results])
+    kinds = {}
+    for _, _, kind in results:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    errors = sum(1 for _, status, _ in results if status >= 400)
+    resolved = kinds.get("deterministic", 0) + kinds.get("llm", 0)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {k: round(v, 2) for k, v in latencies.items() if k != "count"},
+        "routes": kinds,
+        "deterministic_ratio": round(kinds.get("deterministic", 0) / resolved, 3) if resolved else 0.0,
+        "llm": llm_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--senders", type=int, default=50, help="distinct From numbers to spread the corpus over")
+    parser.add_argument("--llm-latency", type=float, default=0.5,
+                        help="seconds the stubbed OpenAI call takes (time to first token with --fake-server)")
+    parser.add_argument("--fake-server", action="store_true", help="serve OpenAI from a local HTTP fake")
+    parser.add_argument("--with-sleep", action="store_true", help="keep the artificial 1.2s reply delay")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    llm_stats = instrument(args.llm_latency, args.with_sleep, args.fake_server)
+    results, elapsed = replay(load_corpus(args.corpus), args.concurrency, args.repeat, args.senders)
+    summary = report(results, elapsed, llm_stats)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    lat = summary["latency_ms"]
+    print(f"requests     {summary['requests']} ({summary['errors']} errors) in {summary['elapsed_s']}s")
+    print(f"throughput   {summary['throughput_rps']} req/s at concurrency {args.concurrency}")
+    print(f"latency ms   p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"routes       {summary['routes']}  deterministic ratio {summary['deterministic_ratio']}")
+    print(f"llm          {summary['llm']}")
+
+
+if __name__ == "__main__":
+    main()
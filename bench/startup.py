@@ -0,0 +1,81 @@
+"""Import-to-ready time of a fresh process, cold (no snapshot file) and warm.
+
+    python bench/startup.py [--runs 5] [--json]
+
+Each run is a new interpreter that imports cmvprun and requests /ready, so the numbers
+include module imports, catalog loading and app setup, as a new worker would see them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import cmvprun
+imported = time.perf_counter()
+response = cmvprun.app.test_client().get("/ready")
+ready = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "ready_s": ready - start,
+    "status": response.status_code,
+    "source": response.get_json().get("source"),
+}))
+"""
+
+
+def probe(snapshot_file):
+    env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "bench"),
+               CATALOG_SNAPSHOT_FILE=snapshot_file, CATALOG_POLL_INTERVAL="0")
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(runs):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_file = os.path.join(tmp, "snapshot.pickle")
+        cold = []
+        for _ in range(runs):
+            if os.path.exists(snapshot_file):
+                os.remove(snapshot_file)
+            cold.append(probe(snapshot_file))
+        results["cold"] = cold
+        results["warm"] = [probe(snapshot_file) for _ in range(runs)]
+        results["no_snapshot"] = [probe("") for _ in range(runs)]
+    return {
+        mode: {
+            "import_ms": round(statistics.median(r["import_s"] for r in rows) * 1000, 1),
+            "ready_ms": round(statistics.median(r["ready_s"] for r in rows) * 1000, 1),
+            "source": rows[-1]["source"],
+            "ok": all(r["status"] == 200 for r in rows),
+        }
+        for mode, rows in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = run(args.runs)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    for mode, stats in summary.items():
+        print(f"{mode:12} import {stats['import_ms']:7.1f} ms  ready {stats['ready_ms']:7.1f} ms  "
+              f"catalog from {stats['source']}{'' if stats['ok'] else '  (NOT READY)'}")
+
+
+if __name__ == "__main__":
+    main()
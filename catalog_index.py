@@ -0,0 +1,150 @@
+import re
+from collections import defaultdict
+
+from rapidfuzz import fuzz, process
+
+from aliases import ALIASES, QUERY_FILLER, sound_key
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MAX_GRAM = 3
+# The only words partial() may ignore; anything else ("is", "it") must be a catalog word
+STOPWORDS = {"a", "an", "the", "of", "and", "with", "for", "in", "x", "me", "some", "pls", "please"}
+QUESTION_WORDS = {"is", "are", "was", "do", "does", "did", "can", "could", "will", "would", "should",
+                  "what", "how", "why", "when", "where", "which", "who"}
+# Catalog words that describe a product without naming one: "is it halal" asks about certification
+DESCRIPTORS = {"halal", "fresh", "frozen", "tariq", "premium", "genuine", "grade"}
+# Chat replies ("No." to the feedback prompt) that also occur in names like "(No Fat)"
+REPLY_WORDS = {"no", "yes", "ok", "okay", "k", "kk", "y", "n", "ya", "yeah", "yep", "nope", "na", "nah"}
+# Only a misspelt alias ("kalegi") gets a fuzzy second chance, never an arbitrary word
+ALIAS_FUZZY_CUTOFF = 80
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def is_reply(text):
+    words = tokenize(text)
+    return not words or all(w in REPLY_WORDS for w in words)
+
+
+def is_question(text, words):
+    return text.rstrip().endswith("?") or bool(words) and words[0] in QUESTION_WORDS
+
+
+def grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class CatalogIndex:
+    """Lookup structures built once per catalog: exact names, categories, tokens, n-grams and aliases."""
+
+    def __init__(self, catalog, aliases=ALIASES):
+        self.records = []
+        self.keys = []
+        self.by_name = {}
+        self.by_category = {}
+        self.tokens = defaultdict(set)
+        self.grams = defaultdict(set)
+        self.sounds = defaultdict(set)
+        self.alias_keys = []
+
+        for category, products in catalog.items():
+            self.by_category[normalize(category)] = (category, products)
+            for product in products:
+                key = normalize(product['name'])
+                rid = len(self.records)
+                self.records.append((product, category))
+                self.keys.append(key)
+                self.by_name.setdefault(key, (product, category))
+                for token in tokenize(key):
+                    self.tokens[token].add(rid)
+                # 1- and 2-grams answer short queries directly, 3-grams narrow longer ones
+                for n in range(1, MAX_GRAM + 1):
+                    for gram in grams(key, n):
+                        self.grams[gram].add(rid)
+
+        # Catalog words and aliases share one table keyed by sound, so "nihari" finds the
+        # "(Niharri)" product and "keema" finds every mince with a single dict lookup
+        for token, rids in self.tokens.items():
+            if len(token) >= 3:
+                self.sounds[sound_key(token)] |= rids
+        for alias, terms in aliases.items():
+            rids = set().union(*(self._postings(tokenize(term)) for term in terms))
+            if rids:
+                key = sound_key(alias)
+                self.sounds[key] |= rids
+                self.alias_keys.append(key)
+
+    def category(self, text):
+        return self.by_category.get(normalize(text))
+
+    def exact(self, text):
+        return self.by_name.get(normalize(text))
+
+    def _resolve(self, rids):
+        return [self.records[rid] for rid in sorted(rids)]
+
+    def substring(self, text):
+        text = normalize(text)
+        if is_reply(text):
+            return []
+        if len(text) <= MAX_GRAM:
+            return self._resolve(self.grams.get(text, ()))
+
+        postings = sorted((self.grams.get(g, set()) for g in grams(text, MAX_GRAM)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return self._resolve(
+            rid for rid in candidates if text in self.keys[rid]
+        )
+
+    def _postings(self, words):
+        if not words or any(w not in self.tokens for w in words):
+            return set()
+        postings = sorted((self.tokens[w] for w in words), key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def partial(self, text):
+        # Every query word but a stopword must be a known catalog token
+        words = [w for w in tokenize(text) if w not in STOPWORDS]
+        if is_reply(text):
+            return []
+        if is_question(text, words) and not any(w in self.tokens and w not in DESCRIPTORS for w in words):
+            return []
+        return self._resolve(self._postings(words))
+
+    def _sounds_like(self, word):
+        key = sound_key(word)
+        rids = self.sounds.get(key)
+        # Keys of three letters are one edit from too much ("more" -> "mur" ~ murgh)
+        if rids is None and len(key) >= 4 and self.alias_keys:
+            match = process.extractOne(key, self.alias_keys, scorer=fuzz.ratio, score_cutoff=ALIAS_FUZZY_CUTOFF)
+            rids = self.sounds[match[0]] if match else None
+        return rids
+
+    def alias(self, text):
+        """Products for queries that only match once aliases, spelling variants and filler are
+        accounted for; plain catalog wording is left to substring()/partial()."""
+        tokens = tokenize(text)
+        # "is your meat halal" asks about certification, not for every halal meat product
+        if is_question(text, tokens) and any(t in DESCRIPTORS for t in tokens):
+            return []
+        words = [w for w in tokens if len(w) >= 3]
+        if not words or all(w in self.tokens for w in words):
+            return []
+        postings = []
+        for word in words:
+            if word in QUERY_FILLER:
+                continue
+            rids = self._sounds_like(word)
+            if not rids:
+                return []
+            postings.append(rids)
+        if not postings:
+            return []
+        postings.sort(key=len)
+        return self._resolve(set(postings[0]).intersection(*postings[1:]))
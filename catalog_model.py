@@ -0,0 +1,214 @@
+import hashlib
+import json
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+PRICE_RE = re.compile(r"£\s*([0-9]+)(?:\.([0-9]{1,2}))?")
+WORD_RE = re.compile(r"[a-z0-9]+")
+MAX_LISTED = 15
+
+# "chicken under £6", "lamb below 10", "beef over £20"
+BOUND_RE = re.compile(
+    r"^(?P<term>.*?)\s*\b(?P<op>under|below|less than|cheaper than|up to|max|over|above|more than)\b"
+    r"\s*£?\s*(?P<amount>[0-9]+(?:\.[0-9]{1,2})?)\s*(?:pounds?|quid|gbp)?\s*$"
+)
+CHEAPEST_RE = re.compile(r"\b(?P<op>cheapest|lowest priced|least expensive|most expensive|priciest|dearest)\b")
+OUT_OF_STOCK_RE = re.compile(r"\b(?:out of stock|sold out|unavailable|not in stock)\b")
+FILLER = {
+    "what", "whats", "is", "are", "the", "your", "you", "any", "show", "me", "do", "have",
+    "got", "which", "items", "item", "products", "product", "price", "prices", "for",
+    "a", "an", "of", "in", "i", "can", "get", "all", "list", "with", "something", "anything",
+}
+
+
+def stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def words(text):
+    return [stem(w) for w in WORD_RE.findall(text.lower())]
+
+
+def parse_price(text):
+    match = PRICE_RE.search(text)
+    pence = None
+    if match:
+        pence = int(match.group(1)) * 100 + int((match.group(2) or "0").ljust(2, "0"))
+    return pence, "out of stock" not in text.lower()
+
+
+def format_pence(pence):
+    return f"£{pence // 100}.{pence % 100:02d}"
+
+
+class Product:
+    __slots__ = ("name", "path", "pence", "in_stock", "price")
+
+    def __init__(self, name, path, price):
+        self.name = name
+        self.path = path  # ("MARINATED MEATS", "Chicken")
+        self.price = price  # original display string
+        self.pence, self.in_stock = parse_price(price)
+
+    @property
+    def category(self):
+        return self.path[0]
+
+    def label(self):
+        return " / ".join(p.title() for p in self.path)
+
+    def __repr__(self):
+        return f"Product({self.name!r}, {self.path!r}, {self.pence})"
+
+
+class PriceList:
+    """Products sorted by price with a parallel pence array for bisecting."""
+
+    __slots__ = ("pence", "products")
+
+    def __init__(self, products):
+        ranked = sorted((p for p in products if p.pence is not None), key=lambda p: p.pence)
+        self.products = ranked
+        self.pence = [p.pence for p in ranked]
+
+    def under(self, pence):
+        return self.products[:bisect_right(self.pence, pence)]
+
+    def over(self, pence):
+        return self.products[bisect_left(self.pence, pence):]
+
+
+def flatten(items, path):
+    for name, value in items.items():
+        if isinstance(value, dict):
+            yield from flatten(value, path + (name,))
+        else:
+            yield Product(name, path, value)
+
+
+def validate_catalog(raw):
+    """Raises ValueError naming the first entry that isn't a "name": "£price" string, at any depth."""
+    def check(items, path):
+        if isinstance(items, dict):
+            for name, value in items.items():
+                if isinstance(value, dict):
+                    check(value, path + (name,))
+                elif not isinstance(value, str):
+                    raise ValueError(f"{' / '.join(path + (name,))}: price must be a string, got {value!r}")
+        elif isinstance(items, list):
+            for item in items:
+                if not (isinstance(item, dict) and isinstance(item.get("name"), str) and isinstance(item.get("price"), str)):
+                    raise ValueError(f"{' / '.join(path)}: expected {{\"name\": ..., \"price\": ...}} strings, got {item!r}")
+        else:
+            raise ValueError(f"{' / '.join(path)}: expected an object or a list, got {items!r}")
+
+    if not isinstance(raw, dict) or not raw:
+        raise ValueError("catalog must be a non-empty object of categories")
+    for category, items in raw.items():
+        check(items, (category,))
+
+
+def parse_category(category, items):
+    if isinstance(items, dict):
+        return list(flatten(items, (category,)))
+    return [Product(p['name'], (category,), p['price']) for p in items]
+
+
+def category_hash(items):
+    # Stable across processes: hashes are compared against snapshots pickled by another worker
+    return hashlib.sha1(json.dumps(items, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class Catalog:
+    def __init__(self, raw, previous=None):
+        # Categories whose raw data is unchanged since `previous` keep their parsed records
+        self.hashes = {category: category_hash(items) for category, items in raw.items()}
+        self.categories = {}
+        for category, items in raw.items():
+            if previous is not None and previous.hashes.get(category) == self.hashes[category]:
+                self.categories[category] = previous.categories[category]
+            else:
+                self.categories[category] = parse_category(category, items)
+        self.products = [p for products in self.categories.values() for p in products]
+        members = defaultdict(list)
+        for product in self.products:
+            for word in set(words(product.name)) | {w for part in product.path for w in words(part)}:
+                members[word].append(product)
+        # One sorted price array per word of every name and category path ("lamb", "chicken", ...)
+        self.by_word = {word: PriceList(products) for word, products in members.items()}
+        self.everything = PriceList(self.products)
+
+    def listing(self):
+        return {
+            category: [{"name": p.name, "price": p.price} for p in products]
+            for category, products in self.categories.items()
+        }
+
+    def price_list(self, term):
+        keys = [w for w in words(term) if w not in FILLER]
+        if not keys:
+            return self.everything
+        if any(k not in self.by_word for k in keys):
+            return None
+        lists = sorted((self.by_word[k] for k in keys), key=lambda pl: len(pl.products))
+        if len(lists) == 1:
+            return lists[0]
+        others = [set(map(id, pl.products)) for pl in lists[1:]]
+        return PriceList(p for p in lists[0].products if all(id(p) in o for o in others))
+
+    def out_of_stock(self, term=""):
+        price_list = self.price_list(term)
+        return [p for p in price_list.products if not p.in_stock] if price_list else []
+
+    def answer(self, message):
+        text = " ".join(re.sub(r"['’]", "", message.lower()).replace("?", " ").split())
+
+        if OUT_OF_STOCK_RE.search(text):
+            term = OUT_OF_STOCK_RE.sub(" ", text)
+            products = self.out_of_stock(term)
+            if products or self.price_list(term) is not None:
+                return render("🚫 Currently out of stock:", products, empty="Everything is in stock right now.")
+            return None
+
+        bound = BOUND_RE.match(text)
+        if bound:
+            price_list = self.price_list(bound.group("term"))
+            if price_list is None:
+                return None
+            pence = round(float(bound.group("amount")) * 100)
+            op = bound.group("op")
+            below = op not in ("over", "above", "more than")
+            products = price_list.under(pence) if below else price_list.over(pence)
+            products = [p for p in products if p.in_stock]
+            heading = f"🛒 {describe(bound.group('term'))} {'under' if below else 'over'} {format_pence(pence)}:"
+            return render(heading, products, empty="Nothing in stock at that price.")
+
+        cheapest = CHEAPEST_RE.search(text)
+        if cheapest:
+            term = CHEAPEST_RE.sub(" ", text)
+            price_list = self.price_list(term)
+            if price_list is None:
+                return None
+            products = [p for p in price_list.products if p.in_stock]
+            op = cheapest.group("op")
+            if op in ("most expensive", "priciest", "dearest"):
+                products = products[::-1]
+            heading = f"🛒 {op.capitalize()} {describe(term)}:"
+            return render(heading, products[:3], empty="Nothing in stock right now.")
+
+        return None
+
+
+def describe(term):
+    keys = [w for w in WORD_RE.findall(term.lower()) if w not in FILLER]
+    return " ".join(keys).title() if keys else "Products"
+
+
+def render(heading, products, empty):
+    if not products:
+        return empty
+    lines = [heading] + [f"• {p.name} ({p.label()}): {p.price}" for p in products[:MAX_LISTED]]
+    if len(products) > MAX_LISTED:
+        lines.append(f"…and {len(products) - MAX_LISTED} more.")
+    return "\n".join(lines)
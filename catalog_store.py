@@ -0,0 +1,288 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+
+from basket import Basket
+from catalog_model import Catalog, validate_catalog
+from catalog_index import CatalogIndex
+from fuzzy_search import FuzzySearch
+from postcode_locator import BRANCH_LOCATIONS_FILE, DATA_DIR, OUTCODES_FILE, PostcodeLocator
+from prompt_builder import PromptBuilder, catalog_version
+
+logger = logging.getLogger("TariqBot.catalog")
+
+CATALOG_FILE = os.getenv("CATALOG_FILE", os.path.join(DATA_DIR, "catalog.json"))
+STORE_INFO_FILE = os.getenv("STORE_INFO_FILE", os.path.join(DATA_DIR, "store_info.json"))
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", 5))
+# Prebuilt CatalogSnapshot so cold starts skip parsing and indexing; empty disables it. It's a
+# build artifact, so it lives in the user cache dir rather than next to the data files.
+CACHE_DIR = os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "tariqbot")
+SNAPSHOT_FILE = os.getenv("CATALOG_SNAPSHOT_FILE", os.path.join(CACHE_DIR, "snapshot.pickle"))
+# Everything that shapes the pickled objects: editing any of these invalidates the snapshot file
+SNAPSHOT_MODULES = ("catalog_store", "catalog_model", "catalog_index", "fuzzy_search",
+                    "postcode_locator", "prompt_builder", "basket", "aliases")
+SNAPSHOT_SETTINGS = ("PROMPT_MODE", "PROMPT_TOP_N", "PROMPT_TOKEN_BUDGET", "CATEGORY_PAGE_CHARS")
+# WhatsApp rejects messages over 1600 characters; pages stay under this including header and footer
+PAGE_CHARS = int(os.getenv("CATEGORY_PAGE_CHARS", 1500))
+MORE_FOOTER = "Reply MORE for the next page."
+
+
+def paginate(heading, lines, limit=PAGE_CHARS):
+    # Reserve room for the "(10/10)" counter and the footer so every finished page fits the limit
+    budget = limit - len(heading) - len(" (10/10):") - len(MORE_FOOTER) - 2
+    chunks, chunk, size = [], [], 0
+    for line in lines:
+        if chunk and size + len(line) + 1 > budget:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk or not chunks:
+        chunks.append(chunk)
+    if len(chunks) == 1:
+        return ["\n".join([f"{heading}:"] + chunks[0])]
+    pages = []
+    for i, chunk in enumerate(chunks, 1):
+        page = [f"{heading} ({i}/{len(chunks)}):"] + chunk
+        if i < len(chunks):
+            page.append(MORE_FOOTER)
+        pages.append("\n".join(page))
+    return pages
+
+
+def format_category_pages(category, products):
+    return paginate(f"🛒 Products in {category.title()}", [f"• {p['name']}: {p['price']}" for p in products])
+
+
+def format_menu(listing):
+    return "🗂 Available Categories:\n" + "\n".join(f"• {cat.title()}" for cat in listing)
+
+
+def build_store_locations(info):
+    return {
+        branch: {
+            "address": details.split("|")[0].strip(),
+            "postcode": details.split(",")[-1].strip().split()[0],
+            "hours": info.get("store_hours", "9AM to 9PM"),
+        }
+        for branch, details in info.get("branches", {}).items()
+    }
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog, store info and everything derived from them."""
+
+    def __init__(self, raw_catalog, info, previous=None):
+        # Reject a malformed edit before anything is built from it
+        validate_catalog(raw_catalog)
+        if not isinstance(info, dict):
+            raise ValueError("store info must be an object")
+        self.raw = raw_catalog
+        self.info = info
+        self.version = catalog_version(raw_catalog, info)
+        self.loaded_at = time.time()
+        self.rebuilt = []
+
+        if previous is not None and previous.raw == raw_catalog:
+            self.catalog = previous.catalog
+            self.listing = previous.listing
+            self.index = previous.index
+            self.fuzzy = previous.fuzzy
+            self.category_pages = previous.category_pages
+            self.menu = previous.menu
+        else:
+            self.catalog = Catalog(raw_catalog, previous=previous.catalog if previous else None)
+            self.listing = self.catalog.listing()
+            self.index = CatalogIndex(self.listing)
+            self.fuzzy = FuzzySearch(self.listing)
+            # Replies are served straight from these pre-rendered pages
+            self.category_pages = {}
+            for category, products in self.listing.items():
+                reuse = previous is not None and previous.catalog.categories.get(category) is self.catalog.categories[category]
+                self.category_pages[category] = (
+                    previous.category_pages[category] if reuse else format_category_pages(category, products)
+                )
+                if not reuse:
+                    self.rebuilt.append(f"listing:{category}")
+            self.menu = format_menu(self.listing)
+            self.rebuilt += ["catalog", "index", "fuzzy"]
+
+        if previous is not None and previous.info == info:
+            self.store_locations = previous.store_locations
+            self.locator = previous.locator
+        else:
+            self.store_locations = build_store_locations(info)
+            self.locator = PostcodeLocator(self.store_locations)
+            self.rebuilt += ["store_locations", "locator"]
+
+        if previous is not None and previous.version == self.version:
+            self.prompt = previous.prompt
+        else:
+            self.prompt = PromptBuilder(self.listing, info, self.index)
+            self.rebuilt.append("prompt")
+
+        self.basket = Basket(self.fuzzy, info.get("delivery_policy", ""), self.index)
+
+
+def snapshot_fingerprint(data):
+    digest = hashlib.sha1()
+    for blob in data:
+        digest.update(blob)
+    for path in [OUTCODES_FILE, BRANCH_LOCATIONS_FILE] + [sys.modules[name].__file__ for name in SNAPSHOT_MODULES]:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    digest.update(repr([(name, os.getenv(name)) for name in SNAPSHOT_SETTINGS]).encode())
+    return digest.hexdigest().encode("ascii")
+
+
+def load_snapshot_file(path, fingerprint):
+    """The pickled snapshot at `path` if it was built from exactly these inputs, else None."""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header = len(fingerprint) + 1
+            if data[:header] != fingerprint + b"\n":
+                return None
+            with memoryview(data) as view:
+                return pickle.loads(view[header:])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        logger.warning(f"Ignoring unreadable catalog snapshot {path}", exc_info=True)
+        return None
+
+
+def save_snapshot_file(path, fingerprint, snapshot):
+    try:
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(fingerprint + b"\n")
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp, 0o644)
+        # Atomic swap so a worker starting mid-write never reads half a file
+        os.replace(tmp, path)
+    except OSError:
+        logger.warning(f"Could not write catalog snapshot {path}", exc_info=True)
+
+
+class CatalogStore:
+    """Loads the data files, swaps in a new snapshot when they change and pins one per request."""
+
+    def __init__(self, catalog_file=CATALOG_FILE, info_file=STORE_INFO_FILE, poll_interval=CATALOG_POLL_INTERVAL,
+                 snapshot_file=SNAPSHOT_FILE):
+        self.files = (catalog_file, info_file)
+        self.poll_interval = poll_interval
+        self.snapshot_file = snapshot_file
+        self.lock = threading.Lock()
+        self.pinned = ContextVar("catalog_snapshot", default=None)
+        self.watcher_pid = None
+        self.stamps = self._stamps()
+        self.current, self.source = self._initial()
+        self.reloads = 0
+
+    def _stamps(self):
+        return tuple((st.st_mtime_ns, st.st_size) for st in map(os.stat, self.files))
+
+    def _read_bytes(self):
+        blobs = []
+        for path in self.files:
+            with open(path, "rb") as f:
+                blobs.append(f.read())
+        return blobs
+
+    def _initial(self):
+        data = self._read_bytes()
+        if self.snapshot_file:
+            fingerprint = snapshot_fingerprint(data)
+            snapshot = load_snapshot_file(self.snapshot_file, fingerprint)
+            if snapshot is not None:
+                snapshot.loaded_at = time.time()
+                logger.info(f"Catalog version {snapshot.version} loaded from {self.snapshot_file}")
+                return snapshot, "snapshot_file"
+        snapshot = CatalogSnapshot(*[json.loads(blob) for blob in data])
+        if self.snapshot_file:
+            save_snapshot_file(self.snapshot_file, fingerprint, snapshot)
+        return snapshot, "built"
+
+    def reload(self, force=False):
+        with self.lock:
+            stamps = None
+            try:
+                stamps = self._stamps()
+                if stamps == self.stamps and not force:
+                    return False
+                data = self._read_bytes()
+                raw_catalog, info = [json.loads(blob) for blob in data]
+                snapshot = CatalogSnapshot(raw_catalog, info, previous=self.current)
+            except (OSError, ValueError):
+                # A half-written file or a bad edit; keep serving the old snapshot until the files change again
+                logger.exception(f"Catalog reload failed, keeping version {self.current.version}")
+                if stamps is not None:
+                    self.stamps = stamps
+                return False
+            self.stamps = stamps
+            if snapshot.version == self.current.version:
+                return False
+            # Single reference swap: requests already holding the old snapshot keep using it
+            self.current = snapshot
+            self.source = "built"
+            self.reloads += 1
+            logger.info(f"Catalog version {snapshot.version} loaded, rebuilt: {', '.join(snapshot.rebuilt)}")
+            if self.snapshot_file:
+                save_snapshot_file(self.snapshot_file, snapshot_fingerprint(data), snapshot)
+            return True
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload()
+            except Exception:
+                # Whatever a bad edit breaks, the thread must survive to pick up the fix
+                logger.exception(f"Catalog reload failed, keeping version {self.current.version}")
+
+    def ensure_watcher(self):
+        # Started lazily so each forked worker gets its own thread
+        if self.poll_interval <= 0 or self.watcher_pid == os.getpid():
+            return
+        with self.lock:
+            if self.watcher_pid != os.getpid():
+                self.watcher_pid = os.getpid()
+                threading.Thread(target=self._watch, name="catalog-watcher", daemon=True).start()
+
+    def snapshot(self):
+        return self.pinned.get() or self.current
+
+    def pin(self):
+        self.ensure_watcher()
+        self.pinned.set(self.current)
+
+    def unpin(self):
+        self.pinned.set(None)
+
+    def stats(self):
+        snapshot = self.current
+        return {
+            "version": snapshot.version,
+            "source": self.source,
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "products": len(snapshot.catalog.products),
+        }
+
+
+if __name__ == "__main__":
+    # Build step: python catalog_store.py writes the snapshot file so new instances start from it
+    import catalog_store  # pickle classes under their importable module name, not __main__
+    logging.basicConfig(level=logging.INFO)
+    store = catalog_store.CatalogStore(poll_interval=0)
+    print(f"Catalog version {store.current.version} ({store.source}) -> {store.snapshot_file}")
@@ -1,12 +1,12 @@
 import os
 import logging
+import re
+import threading
 import time
 from datetime import datetime, timedelta
 import pytz
 from flask import Flask, request, jsonify, Response
-from flask_caching import Cache
 from dotenv import load_dotenv
-from openai import OpenAI
 from rapidfuzz import process
 from twilio.request_validator import RequestValidator
 from twilio.twiml.messaging_response import MessagingResponse
@@ -16,196 +16,545 @@ load_dotenv()
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-from store_info import store_info as STORE_INFO
-from product_catalog import PRODUCT_CATALOG
+from catalog_store import CatalogStore, paginate
+from prompt_builder import CHARS_PER_TOKEN, estimate_tokens
+from async_replies import ASYNC_REPLIES, ReplyWorkerPool, make_sender
+from answer_cache import AnswerCache, depends_on_history
+from session_store import make_cache_store, make_session_store, new_session
+from idempotency import SingleFlight, dedupe_keys
+from intent_router import Intent, IntentRouter
+from postcode_locator import POSTCODE_RE
+from metrics import REGISTRY
+from streaming import STREAM_REPLIES, EstimatedUsage, consume_stream
+from conversation_log import ConversationLog, note
+from rate_limit import THROTTLE_MESSAGE, RateLimiter
+from model_router import ModelRouter, FALLBACK_MODEL, LLM_MAX_TOKENS, LLM_TIMEOUT, PRIMARY_MODEL, SYNC_DEADLINE
 
 # Flask app setup
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "supersecret")
-cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
+sessions = make_session_store()
+cache = make_cache_store(sessions)
 
 # Logging & OpenAI
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TariqBot")
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = None
+client_lock = threading.Lock()
+
+def get_client():
+    # openai is the slowest import by far, so it is only loaded for the first LLM-bound message
+    global client
+    if client is None:
+        with client_lock:
+            if client is None:
+                from openai import OpenAI
+                # Retries would blow through the reply deadline; the router falls back instead
+                client = OpenAI(api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT, max_retries=0)
+    return client
 
 # Constants
 GOODBYE_KEYWORDS = {"bye", "goodbye", "thanks", "thank you", "ta"}
 GREETINGS = {"hi", "hello", "yo", "salaam", "assalamu alaikum"}
+MENU_KEYWORDS = {"menu", "categories", "all categories"}
+MORE_KEYWORDS = {"more", "next", "next page", "more please", "show more", "see more"}
+END_OF_LISTING = "That's everything in this category. Reply MENU to see all categories."
+END_OF_RESULTS = "That's everything that matched. Reply MENU to see all categories."
 FEEDBACK_PROMPT = "Was this response helpful? Reply YES or NO."
+BUSY_MESSAGE = "Sorry, we're very busy right now. Please try again in a few minutes."
+BUSY_FALLBACK = "We're very busy right now, so here is what we found in our catalog:"
 SESSION_TTL = 7 * 24 * 3600
+# "Thanks!" and "No." are how people type on WhatsApp; keyword replies ignore the punctuation
+PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+# "any stores near HA9?", "I live in E17": an outcode next to any of these asks for the nearest branch
+NEAR_POSTCODE_RE = re.compile(r"\b(?:near|nearby|nearest|closest|stores?|shops?|branch(?:es)?|live\s+in|based\s+in)\b")
 STALE_DURATION = timedelta(days=1)
-
-# Normalize catalog to list format
-for category, items in list(PRODUCT_CATALOG.items()):
-    if isinstance(items, dict):
-        PRODUCT_CATALOG[category] = [{"name": k, "price": v} for k, v in items.items()]
-
-store_locations = {
-    branch: {
-        "address": details.split("|")[0].strip(),
-        "postcode": details.split(",")[-1].strip().split()[0],
-        "hours": STORE_INFO.get("store_hours", "9AM to 9PM"),
-    }
-    for branch, details in STORE_INFO.get("branches", {}).items()
-}
+FUZZY_MAX_WORDS = 4
+PAGED_ROUTES = {"category", "fuzzy_category", "next_page", "alias", "substring", "fuzzy_product"}
+
+# Catalog, store info and their indexes are loaded from data/ and hot-swapped when the files change
+CATALOG_STORE = CatalogStore()
+ANSWER_CACHE = AnswerCache()
+MODEL_ROUTER = ModelRouter()
+CONVERSATIONS = ConversationLog()
+# On Redis or SQLite the buckets are shared, so limits hold across workers
+LIMITER = RateLimiter(cache)
+
+# Prometheus metrics, served as text on /metrics
+STAGE_SECONDS = REGISTRY.histogram("tariqbot_stage_seconds", "Time spent in each stage of a WhatsApp request", ("stage",))
+ROUTE_SECONDS = REGISTRY.histogram("tariqbot_route_seconds", "find_products latency by the branch that answered", ("route",))
+REQUESTS = REGISTRY.counter("tariqbot_requests_total", "WhatsApp webhook requests by HTTP status", ("status",))
+MODEL_CHOICES = REGISTRY.counter("tariqbot_model_choice_total", "Model picked for messages sent to the LLM", ("model",))
+LLM_TOKENS = REGISTRY.counter("tariqbot_llm_tokens_total", "OpenAI token usage reported by completions", ("model", "kind"))
+STREAM_CUTS = REGISTRY.counter("tariqbot_stream_cuts_total", "Streamed replies stopped early at the length budget", ("model",))
+
+def snapshot():
+    return CATALOG_STORE.snapshot()
+
+@app.before_request
+def pin_catalog():
+    # Each request sees one consistent catalog version even if a reload lands mid-request
+    CATALOG_STORE.pin()
+
+@app.teardown_request
+def unpin_catalog(exc):
+    CATALOG_STORE.unpin()
 
 def get_uk_time():
     return datetime.now(pytz.timezone("Europe/London")).strftime("%A, %d %B %Y, %I:%M %p")
 
-def format_store_info(info):
-    return "\n".join(f"{k.replace('_', ' ').title()}: {v}" for k, v in info.items())
-
-def format_product_catalog(catalog):
-    lines = []
-    for category, products in catalog.items():
-        lines.append(f"\n🛒 {category.title()}:")
-        for product in products:
-            lines.append(f"• {product['name']}: {product['price']}")
-    return "\n".join(lines)
-
-def format_category_products(category, products):
-    lines = [f"🛒 Products in {category.title()}:"]
-    lines.extend(f"• {p['name']}: {p['price']}" for p in products)
-    return "\n".join(lines)
-
 def locate_store_by_postcode(message):
     msg = message.lower()
+    store_locations = snapshot().store_locations
     for area, data in store_locations.items():
-        if area.lower() in msg or data["postcode"].lower() in msg:
+        if area.lower() in msg:
             return f"Closest store: {area}\nAddress: {data['address']}\nHours: {data['hours']}"
-    return None
+    nearest = snapshot().locator.nearest_to(msg)
+    if not nearest:
+        return None
+    code, branches = nearest
+    lines = [f"📍 Nearest stores to {code}:"]
+    for area, km in branches:
+        data = store_locations[area]
+        lines.append(f"• {area} ({km:.1f} km): {data['address']} | Hours: {data['hours']}")
+    return "\n".join(lines)
 
-def answer_faqs(message):
-    msg = message.lower()
-    if "time" in msg or "clock" in msg:
-        return f"Current UK time: {get_uk_time()}", True
-    if any(k in msg for k in ("hours", "opening", "closing")):
-        return f"Store hours: {STORE_INFO.get('store_hours', '9AM to 9PM')}", True
-    if "delivery" in msg:
-        return STORE_INFO.get("delivery_policy", "We offer fast delivery."), True
-    if "location" in msg or "address" in msg:
-        loc = locate_store_by_postcode(msg)
-        return loc or f"Main store is at {STORE_INFO.get('store_location', 'Unavailable')}", True
-    if "contact" in msg:
-        return f"Contact us at {STORE_INFO.get('contact', 'Unavailable')}", True
-    if "history" in msg or "about" in msg:
-        return STORE_INFO.get("store_history", "We are proud to serve the community."), True
-    return None, False
-
-def search_by_category(message):
-    match = process.extractOne(message.lower(), PRODUCT_CATALOG.keys(), score_cutoff=60)
-    return format_category_products(match[0], PRODUCT_CATALOG[match[0]]) if match else None
+def reply_greeting(message):
+    return "Hello! How can I assist you today with your Tariq Halal Meat Shop needs?"
+
+def reply_menu(message):
+    return snapshot().menu
+
+def reply_time(message):
+    return f"Current UK time: {get_uk_time()}"
+
+def reply_hours(message):
+    return f"Store hours: {snapshot().info.get('store_hours', '9AM to 9PM')}"
+
+def reply_delivery(message):
+    return snapshot().info.get("delivery_policy", "We offer fast delivery.")
+
+def reply_location(message):
+    loc = locate_store_by_postcode(message)
+    return loc or f"Main store is at {snapshot().info.get('store_location', 'Unavailable')}"
+
+def reply_contact(message):
+    return f"Contact us at {snapshot().info.get('contact', 'Unavailable')}"
+
+def reply_history(message):
+    return snapshot().info.get("store_history", "We are proud to serve the community.")
+
+# Matched as whole words in one pass; the lowest priority number wins when several match
+INTENTS = [
+    Intent("greeting", GREETINGS, reply_greeting, 0, exact=True),
+    Intent("menu", MENU_KEYWORDS, reply_menu, 1, exact=True),
+    # Delivery outranks hours and time: "what time do you deliver", "delivery time to manchester"
+    Intent("delivery", ("delivery", "deliver", "delivers", "deliveries", "shipping"), reply_delivery, 10),
+    # Only phrases about the shop's hours; bare "open"/"close" also mean "open a box", "close to E17"
+    Intent("hours", ("hours", "opening hours", "opening times", "opening time", "closing time", "closing times",
+                     "what time do you open", "what time do you close", "what time do you shut",
+                     "when do you open", "when do you close", "when are you open", "are you open",
+                     "open on sunday", "open today", "open tomorrow", "open now",
+                     "closed today", "closed on"), reply_hours, 11),
+    Intent("time", ("time", "clock"), reply_time, 12),
+    Intent("location", ("location", "locations", "address", "branch", "branches", "nearest", "closest",
+                        "near me", "nearby"), reply_location, 13),
+    Intent("contact", ("contact", "phone number", "email"), reply_contact, 14),
+    Intent("history", ("history", "about us", "about you", "about the shop", "about tariq"), reply_history, 15),
+]
+ROUTER = IntentRouter(INTENTS)
+
+def fuzzy_category(message):
+    match = process.extractOne(message.lower(), snapshot().listing.keys(), score_cutoff=60)
+    return match[0] if match else None
+
+def category_reply(category, session=None):
+    pages = snapshot().category_pages[category]
+    if session is not None:
+        if len(pages) > 1:
+            session['paging'] = {"category": category, "page": 0}
+        else:
+            session.pop('paging', None)
+    return pages[0]
+
+def next_page(session):
+    paging = session.get('paging') if session else None
+    if not paging:
+        return None
+    if 'query' in paging:
+        pages = search_pages(paging['route'], paging['query'])
+    else:
+        pages = snapshot().category_pages.get(paging['category'])
+    if not pages:
+        return None
+    paging['page'] += 1
+    if paging['page'] >= len(pages):
+        session.pop('paging')
+        return END_OF_RESULTS if 'query' in paging else END_OF_LISTING
+    return pages[paging['page']]
 
 def fuzzy_product_search(query):
-    results = []
-    for category, products in PRODUCT_CATALOG.items():
-        names = [p['name'].lower() for p in products]
-        match = process.extractOne(query, names, score_cutoff=75)
-        if match:
-            prod = next(p for p in products if p['name'].lower() == match[0])
-            results.append((prod['name'], prod['price'], category.title()))
+    results = [(name, price, category) for name, price, category, _ in snapshot().fuzzy.search(query)]
     return results or None
 
-def find_products(message):
-    text = message.strip().lower()
-
-    if text in GREETINGS:
-        return "Hello! How can I assist you today with your Tariq Halal Meat Shop needs?"
-
-    if text in {"menu", "categories", "all categories"}:
-        return "🗂 Available Categories:\n" + "\n".join(f"• {cat.title()}" for cat in PRODUCT_CATALOG)
-
-    if text in PRODUCT_CATALOG:
-        return format_category_products(text, PRODUCT_CATALOG[text])
-
-    for category, products in PRODUCT_CATALOG.items():
-        for product in products:
-            if product['name'].lower() == text:
-                return f"🛒 {product['name']}: {product['price']}"
-
-    faq, is_faq = answer_faqs(message)
-    if is_faq:
-        return faq
+def product_lines(found):
+    return [f"• {product['name']} ({category.title()}): {product['price']}" for product, category in found]
+
+# Product searches whose results are paged like categories. Only (route, query) goes in the
+# session; "more" re-runs the search, which costs microseconds against the index.
+SEARCHES = {
+    "alias": ("🛒 Products matching your query", lambda text: product_lines(snapshot().index.alias(text))),
+    "substring": ("🛒 Products matching your query", lambda text: product_lines(
+        snapshot().index.substring(text) or snapshot().index.partial(text))),
+    "fuzzy_product": ("🛒 Closest matches", lambda text: [
+        f"• {n} ({c}): {p}" for n, p, c in fuzzy_product_search(text) or ()]),
+}
 
-    cat = search_by_category(text)
+def search_pages(route, text):
+    heading, search = SEARCHES[route]
+    lines = search(text)
+    return paginate(heading, lines) if lines else None
+
+def search_reply(route, text, session=None):
+    pages = search_pages(route, text)
+    if not pages:
+        return None
+    if session is not None:
+        if len(pages) > 1:
+            session['paging'] = {"route": route, "query": text, "page": 0}
+        else:
+            session.pop('paging', None)
+    return pages[0]
+
+def route_message(message, session=None):
+    text = message.strip().lower()
+    intent = ROUTER.classify(text)
+    snap = snapshot()
+
+    if text in MORE_KEYWORDS:
+        page = next_page(session)
+        if page:
+            return "next_page", page
+
+    if intent and intent.exact:
+        return intent.name, intent.handler(text)
+
+    if POSTCODE_RE.fullmatch(text) or (
+            (intent is None or intent.name == "location") and NEAR_POSTCODE_RE.search(text) and POSTCODE_RE.search(text)):
+        nearest = locate_store_by_postcode(text)
+        if nearest:
+            return "postcode", nearest
+
+    category = snap.index.category(text)
+    if category:
+        return "category", category_reply(category[0], session)
+
+    exact = snap.index.exact(text)
+    if exact:
+        product, _ = exact
+        return "product", f"🛒 {product['name']}: {product['price']}"
+
+    priced = snap.catalog.answer(text)
+    if priced:
+        return "price_query", priced
+
+    # "chicken breast, lamb chops and 2 boneless mutton": one batched fuzzy pass over every item
+    basket = snap.basket.answer(text, strict=intent is not None)
+    if basket:
+        return "basket", basket
+
+    if intent:
+        return intent.name, intent.handler(text)
+
+    # "kaleji", "do you have qeema", "lamb paye": dictionary lookups before any fuzzy matching
+    aliased = search_reply("alias", text, session)
+    if aliased:
+        return "alias", aliased
+
+    cat = fuzzy_category(text)
     if cat:
-        return cat
-
-    matches = [
-        (product['name'], product['price'], category.title())
-        for category, products in PRODUCT_CATALOG.items()
-        for product in products
-        if text in product['name'].lower()
-    ]
-    if matches:
-        return "\n".join(["🛒 Products matching your query:"] + [f"• {n} ({c}): {p}" for n, p, c in matches])
-
-    return None
+        return "fuzzy_category", category_reply(cat, session)
 
-def generate_ai_response(message, memory, model='gpt-4'):
-    context = (
-        "You are the helpful WhatsApp assistant for Tariq Halal Meat Shop UK.\n"
-        "Answer using store info and product catalog.\n"
-        f"\nSTORE INFO:\n{format_store_info(STORE_INFO)}\n"
-        f"\nPRODUCT CATALOG:\n{format_product_catalog(PRODUCT_CATALOG)}"
-    )
+    matches = search_reply("substring", text, session)
+    if matches:
+        return "substring", matches
+
+    # Long sentences fuzzy-match on a single shared word, leave those to the LLM
+    if len(text.split()) <= FUZZY_MAX_WORDS:
+        ranked = search_reply("fuzzy_product", text, session)
+        if ranked:
+            return "fuzzy_product", ranked
+
+    return None, None
+
+def find_products(message, session=None):
+    start = time.perf_counter()
+    route, reply = route_message(message, session)
+    if session is not None and route not in PAGED_ROUTES:
+        # Anything else ends the listing, so a later "more" doesn't page a stale category
+        session.pop('paging', None)
+    ROUTE_SECONDS.observe(time.perf_counter() - start, route=route or "llm")
+    note(route=route or "llm")
+    logger.info(f"Route {route or 'llm'} for {message.strip()!r}")
+    return reply
+
+def generate_ai_response(message, memory, model=PRIMARY_MODEL, timeout=None, max_tokens=LLM_MAX_TOKENS,
+                         on_first_chunk=None):
+    context = snapshot().prompt.system_prompt(message, memory)
     messages = [{"role": "system", "content": context}] + [
         msg for h in memory[-5:] for msg in (
             {"role": "user", "content": h['user']},
             {"role": "assistant", "content": h['bot']}
         )
     ] + [{"role": "user", "content": message}]
-    return client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.4,
-        max_tokens=500
-    ).choices[0].message.content.strip()
+    llm = get_client().with_options(timeout=timeout) if timeout else get_client()
+    with STAGE_SECONDS.time(stage="llm"):
+        if STREAM_REPLIES:
+            # Stops reading (and generating) once the reply is WhatsApp-sized
+            streamed = consume_stream(llm.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            ), on_first_chunk=on_first_chunk)
+            usage, reply = streamed.usage, streamed.text
+            if streamed.cut:
+                STREAM_CUTS.inc(model=model)
+                note(cut=True)
+            if usage is None:
+                # Cut streams close before the usage chunk arrives; count an estimate rather than nothing
+                usage = EstimatedUsage(sum(estimate_tokens(m["content"]) for m in messages),
+                                       streamed.received_chars // CHARS_PER_TOKEN + 1)
+                note(usage="estimated")
+        else:
+            completion = llm.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens
+            )
+            usage, reply = getattr(completion, "usage", None), completion.choices[0].message.content.strip()
+    if usage:
+        LLM_TOKENS.inc(usage.prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens, model=model, kind="completion")
+        note(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    return reply
+
+def openai_errors():
+    # Evaluated only while handling an exception, so openai stays unimported until it's needed
+    from openai import APIError
+    return APIError
+
+def deterministic_fallback(message):
+    # Used when the LLM is saturated or too slow: the closest catalog matches, whatever the length
+    ranked = fuzzy_product_search(message.strip().lower())
+    if ranked:
+        return "\n".join([BUSY_FALLBACK] + [f"• {n} ({c}): {p}" for n, p, c in ranked])
+    return BUSY_MESSAGE
+
+def routed_ai_response(message, memory, model=PRIMARY_MODEL, remaining=None, on_first_chunk=None, sender=None):
+    """Returns (reply, from_llm); falls back to the catalog when rate limited, over budget or on upstream failure."""
+    # The global slot is held for the whole call, so the cap bounds LLM calls in flight across workers
+    with LIMITER.llm_slot(sender) as limited:
+        if not limited:
+            return llm_response(message, memory, model, remaining, on_first_chunk)
+    MODEL_CHOICES.inc(model="deterministic")
+    note(model="deterministic", routing=limited)
+    return deterministic_fallback(message), False
+
+def llm_response(message, memory, model, remaining, on_first_chunk):
+    decision = MODEL_ROUTER.choose(model, remaining)
+    MODEL_CHOICES.inc(model=decision.model or "deterministic")
+    note(model=decision.model or "deterministic", routing=decision.reason)
+    if decision.fallback:
+        return deterministic_fallback(message), False
+    try:
+        with MODEL_ROUTER.track(decision):
+            reply = generate_ai_response(message, memory, model=decision.model, timeout=decision.timeout,
+                                         max_tokens=decision.max_tokens, on_first_chunk=on_first_chunk)
+        return reply, True
+    except openai_errors() as e:
+        logger.warning(f"{decision.model} failed after routing {decision}: {e.__class__.__name__}")
+        note(llm_error=e.__class__.__name__)
+        return deterministic_fallback(message), False
+
+def cached_ai_response(message, memory, model=PRIMARY_MODEL, remaining=None, on_first_chunk=None, sender=None):
+    if depends_on_history(message, memory):
+        ANSWER_CACHE.skip()
+        note(cache="skip")
+        return routed_ai_response(message, memory, model, remaining, on_first_chunk, sender)[0]
+    key = ANSWER_CACHE.key(message, snapshot().version)
+    reply = ANSWER_CACHE.get(key) if key else None
+    note(cache="hit" if reply is not None else "miss")
+    if reply is None:
+        reply, from_llm = routed_ai_response(message, memory, model, remaining, on_first_chunk, sender)
+        if key and from_llm:
+            ANSWER_CACHE.put(key, reply)
+    return reply
+
+def record_turn(session_key, session, body, reply, merge=False):
+    if merge:
+        # After a slow LLM call: if a newer message saved the session meanwhile, append to that
+        # copy so its turns and paging survive instead of overwriting them with ours
+        latest = sessions.get(session_key)
+        if latest is not None and latest['last'] > session['last']:
+            session = latest
+    session['history'].append({"user": body, "bot": reply})
+    session['last'] = datetime.utcnow()
+    with STAGE_SECONDS.time(stage="session_store"):
+        sessions.set(session_key, session, timeout=SESSION_TTL)
+
+def deliver_reply(job, remaining):
+    CATALOG_STORE.pin()
+    try:
+        with CONVERSATIONS.turn(job['body'], job['to'], started=job.get('received'), route="llm", mode="async"):
+            return answer_job(job, remaining)
+    finally:
+        CATALOG_STORE.unpin()
+
+def answer_job(job, remaining):
+    session = sessions.get(job['session_key']) or new_session()
+    session.pop('paging', None)
+    sent = []
+
+    def send_first_chunk(text):
+        # Streaming only: the opening sentences go out while the rest is still generating
+        REPLY_POOL.sender.send(job['to'], text, from_=job.get('from'))
+        sent.append(text)
+
+    reply = cached_ai_response(job['body'], session['history'], model=job['model'],
+                               remaining=remaining, on_first_chunk=send_first_chunk, sender=job['to'])
+    record_turn(job['session_key'], session, job['body'], reply, merge=True)
+    if sent and reply.startswith(sent[0]):
+        return reply[len(sent[0]):].strip()
+    return reply
+
+def fallback_reply(job, reason):
+    # The webhook already returned empty TwiML; this is the customer's only answer
+    MODEL_CHOICES.inc(model="deterministic")
+    with CONVERSATIONS.turn(job['body'], job['to'], started=job.get('received'), route="llm", mode="async",
+                            model="deterministic", routing=reason):
+        return deterministic_fallback(job['body'])
+
+# Opt-in (ASYNC_REPLIES=1): LLM-bound messages are answered out of band by this pool
+REPLY_POOL = ReplyWorkerPool(deliver_reply, make_sender(), fallback=fallback_reply) if ASYNC_REPLIES else None
+REPLIES = SingleFlight(cache)
+
+# Running counts are counters (summed over workers); sizes, depths and in-flight are gauges
+REGISTRY.expose("tariqbot_catalog", CATALOG_STORE.stats, counters=("reloads",))
+REGISTRY.expose("tariqbot_answer_cache", ANSWER_CACHE.stats, counters=("hits", "misses", "skips", "evictions"))
+REGISTRY.expose("tariqbot_dedupe", REPLIES.stats, counters=("executed", "replayed", "joined"))
+REGISTRY.expose("tariqbot_model_router", MODEL_ROUTER.stats,
+                counters=("primary", "downgraded", "shrunk", "deterministic", "failures"))
+REGISTRY.expose("tariqbot_conversation_log", CONVERSATIONS.stats, counters=("written", "errors"))
+REGISTRY.expose("tariqbot_rate_limit", LIMITER.stats, counters=(
+    "allowed", "throttled", "dropped", "llm_allowed", "llm_limited", "llm_global_limited", "errors"))
+if REPLY_POOL:
+    REGISTRY.expose("tariqbot_reply_queue", REPLY_POOL.stats,
+                    counters=("submitted", "rejected", "completed", "failed", "expired", "fallbacks"))
+
+def build_reply(body, sender, recipient):
+    start = time.perf_counter()
+    with CONVERSATIONS.turn(body, sender, started=start, mode="async" if REPLY_POOL else "sync"):
+        return compose_reply(body, sender, recipient, start)
+
+def compose_reply(body, sender, recipient, start):
+    # A flooding sender costs one bucket check per message: no session, catalog or LLM work
+    verdict = LIMITER.check_message(sender)
+    if verdict != "allow":
+        note(route="throttled")
+        throttled = MessagingResponse()
+        if verdict == "throttle":
+            throttled.message(THROTTLE_MESSAGE)
+        return str(throttled)
+
+    session_key = f"session_{sender}"
+    with STAGE_SECONDS.time(stage="session_load"):
+        session = sessions.get(session_key) or new_session()
+    history, last_time = session['history'], session['last']
+    # Preferred model only; MODEL_ROUTER may downgrade it or skip the LLM under load
+    model_name = FALLBACK_MODEL if (datetime.utcnow() - last_time) > STALE_DURATION else PRIMARY_MODEL
+
+    low = " ".join(PUNCTUATION_RE.sub(" ", body.lower()).split())
+    if low in ["yes", "no"]:
+        note(route="feedback")
+        return str(MessagingResponse().message("Thanks for your feedback!"))
+    if low in GOODBYE_KEYWORDS:
+        note(route="goodbye")
+        resp = MessagingResponse()
+        resp.message("Goodbye! Have a great day.")
+        resp.message(FEEDBACK_PROMPT)
+        return str(resp)
+
+    reply = find_products(body, session)
+    if reply is None and REPLY_POOL and MODEL_ROUTER.overloaded(REPLY_POOL.jobs.qsize()):
+        # Answer from the catalog now rather than queue behind a backlog that will miss its deadline
+        MODEL_CHOICES.inc(model="deterministic")
+        note(model="deterministic", routing="overloaded")
+        reply = deterministic_fallback(body)
+    if reply is None and REPLY_POOL:
+        job = {"to": sender, "from": recipient, "body": body,
+               "session_key": session_key, "model": model_name, "received": start}
+        if REPLY_POOL.submit(job):
+            # Logged by the worker once the answer is sent
+            note(skip=True)
+            return str(MessagingResponse())
+        logger.warning(f"Reply queue full, turning away {sender}")
+        note(model="busy")
+        busy = MessagingResponse()
+        busy.message(BUSY_MESSAGE)
+        return str(busy)
+
+    remaining = SYNC_DEADLINE - (time.perf_counter() - start)
+    from_catalog = reply is not None
+    reply = reply or cached_ai_response(body, history, model=model_name, remaining=remaining, sender=sender)
+    record_turn(session_key, session, body, reply, merge=not from_catalog)
+
+    twiml = MessagingResponse()
+    twiml.message(reply)
+    if not REPLY_POOL:
+        with STAGE_SECONDS.time(stage="sleep"):
+            time.sleep(1.2)
+    return str(twiml)
 
 @app.route("/whatsapp", methods=["POST"])
 def whatsapp_handler():
+    start = time.perf_counter()
+    status = 500
     try:
-        if not RequestValidator(TWILIO_AUTH_TOKEN).validate(
-            request.url,
-            request.form,
-            request.headers.get("X-Twilio-Signature", "")
-        ):
+        with STAGE_SECONDS.time(stage="validate"):
+            valid = RequestValidator(TWILIO_AUTH_TOKEN).validate(
+                request.url,
+                request.form,
+                request.headers.get("X-Twilio-Signature", "")
+            )
+        if not valid:
+            status = 403
             return "Unauthorized", 403
 
         body = request.values.get("Body", "").strip()
         sender = request.values.get("From", "")
         if not body:
+            status = 400
             return "Empty message", 400
 
         logger.info(f"Received from {sender}: {body}")
-        session_key = f"session_{sender}"
-        session = cache.get(session_key) or {"history": [], "last": datetime.utcnow()}
-        history, last_time = session['history'], session['last']
-        model_name = 'gpt-3.5-turbo' if (datetime.utcnow() - last_time) > STALE_DURATION else 'gpt-4'
-
-        low = body.lower()
-        if low in ["yes", "no"]:
-            return Response(str(MessagingResponse().message("Thanks for your feedback!")), mimetype="application/xml")
-        if low in GOODBYE_KEYWORDS:
-            resp = MessagingResponse()
-            resp.message("Goodbye! Have a great day.")
-            resp.message(FEEDBACK_PROMPT)
-            return Response(str(resp), mimetype="application/xml")
-
-        reply = find_products(body) or generate_ai_response(body, history, model=model_name)
-
-        history.append({"user": body, "bot": reply})
-        session['last'] = datetime.utcnow()
-        cache.set(session_key, session, timeout=SESSION_TTL)
-
-        twiml = MessagingResponse()
-        twiml.message(reply)
-        time.sleep(1.2)
-        return Response(str(twiml), mimetype="application/xml")
+        # Twilio retries and quick double-sends share one computation and one history entry
+        # Repeated "more" is how paging works, so only the MessageSid dedupes those
+        keys = dedupe_keys(request.values.get("MessageSid"), sender, body,
+                           coalesce=body.lower() not in MORE_KEYWORDS)
+        recipient = request.values.get("To")
+        twiml = REPLIES.do(keys, lambda: build_reply(body, sender, recipient))
+        status = 200
+        return Response(twiml, mimetype="application/xml")
     except Exception:
         logger.exception("Error in whatsapp_handler")
         return "Server Error", 500
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="request")
+        REQUESTS.inc(status=status)
 
 @app.route("/")
 def home():
@@ -213,7 +562,33 @@ def home():
 
 @app.route("/health")
 def health():
-    return jsonify({"status": "online"})
+    status = {
+        "status": "online",
+        "catalog": CATALOG_STORE.stats(),
+        "answer_cache": ANSWER_CACHE.stats(),
+        "dedupe": REPLIES.stats(),
+        "model_router": MODEL_ROUTER.stats(),
+        "conversation_log": CONVERSATIONS.stats(),
+        "rate_limit": LIMITER.stats(),
+    }
+    if REPLY_POOL:
+        status["reply_queue"] = REPLY_POOL.stats()
+    return jsonify(status)
+
+@app.route("/ready")
+def ready():
+    # /health is liveness; this is readiness: catalog loaded and the session backend answering
+    try:
+        sessions.backend.get_raw("ready:probe")
+    except Exception:
+        logger.exception("Session backend not reachable")
+        return jsonify({"ready": False, "reason": "sessions"}), 503
+    catalog = CATALOG_STORE.current
+    return jsonify({"ready": True, "catalog": catalog.version, "source": CATALOG_STORE.source})
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", 10000)), debug=False)
@@ -0,0 +1,93 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger("TariqBot.convlog")
+
+# Append-only JSONL, one line per answered message. Off unless set, since it keeps message bodies;
+# resolved to an absolute path so every worker writes the same file whatever its cwd
+CONVERSATION_LOG = os.path.abspath(os.path.expanduser(os.environ["CONVERSATION_LOG"])) if os.getenv("CONVERSATION_LOG") else ""
+# HMAC key for sender ids; without it senders aren't recorded at all
+CONVERSATION_LOG_SECRET = os.getenv("CONVERSATION_LOG_SECRET", "")
+
+current_turn = ContextVar("conversation_turn", default=None)
+
+
+def note(**fields):
+    """Attach fields (route, model, tokens, ...) to the turn being handled, if one is being logged."""
+    turn = current_turn.get()
+    if turn is not None:
+        turn.update(fields)
+
+
+def sender_id(sender, secret):
+    # Phone numbers stay out of the log. A keyed hash still groups one customer's turns, but
+    # unlike a plain hash it can't be reversed by hashing every possible number.
+    if not sender or not secret:
+        return None
+    return hmac.new(secret.encode("utf-8"), sender.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+class ConversationLog:
+    def __init__(self, path=CONVERSATION_LOG, secret=CONVERSATION_LOG_SECRET):
+        self.path = path
+        self.secret = secret
+        if path and not secret:
+            logger.warning("CONVERSATION_LOG_SECRET is not set; conversation log records won't identify senders")
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+        self.written = 0
+        self.errors = 0
+
+    def _open(self):
+        # Reopened after fork so every worker appends through its own O_APPEND handle
+        if self.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self.pid = os.getpid()
+        return self.file
+
+    def write(self, record):
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        try:
+            with self.lock:
+                self._open().write(line)
+                self.written += 1
+        except OSError:
+            self.errors += 1
+            logger.warning(f"Could not append to {self.path}", exc_info=self.errors == 1)
+
+    @contextmanager
+    def turn(self, body, sender, started=None, **fields):
+        """Collects note()d fields while the block runs and appends one record when it ends."""
+        if not self.path:
+            yield None
+            return
+        record = {"ts": round(time.time(), 3), "sender": sender_id(sender, self.secret), "body": body}
+        record.update(fields)
+        started = started if started is not None else time.perf_counter()
+        token = current_turn.set(record)
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = e.__class__.__name__
+            raise
+        finally:
+            current_turn.reset(token)
+            if not record.pop("skip", False):
+                record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                self.write(record)
+
+    def stats(self):
+        return {"written": self.written, "errors": self.errors}
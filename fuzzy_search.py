@@ -0,0 +1,68 @@
+import os
+from rapidfuzz import fuzz, process, utils
+
+FUZZY_TOP_K = int(os.getenv("FUZZY_TOP_K", 5))
+FUZZY_SCORE_CUTOFF = int(os.getenv("FUZZY_SCORE_CUTOFF", 75))
+# WRatio alone lets one short shared word ("a", "halal") through, so every query word must
+# also be close to some word of the name ("tandori" ~ "tandoori", "chop" ~ "chops")
+FUZZY_WORD_CUTOFF = int(os.getenv("FUZZY_WORD_CUTOFF", 80))
+FILLER_WORDS = {"a", "an", "the", "of", "and", "with", "for", "in", "x", "pls", "please"}
+FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", 1))
+# WRatio ties heavily on one shared word, so re-rank a wider pool than the k we return
+FUZZY_CANDIDATES = int(os.getenv("FUZZY_CANDIDATES", 50))
+
+
+class FuzzySearch:
+    """One flattened, pre-normalized choice list scored for the whole catalog in a single call."""
+
+    def __init__(self, catalog):
+        self.choices = []
+        self.entries = []
+        for category, products in catalog.items():
+            for product in products:
+                self.choices.append(utils.default_process(product['name']))
+                self.entries.append((product['name'], product['price'], category.title()))
+
+    def _coverage(self, query_words, choice):
+        choice_words = choice.split()
+        if len(query_words) == 1:
+            # A lone word has nothing else to confirm it ("thanks" is 83 from "shanks"), so it
+            # must also start like the name word it matches
+            choice_words = [c for c in choice_words if c[0] == query_words[0][0]]
+            if not choice_words:
+                return 0
+        scores = [max(fuzz.ratio(w, c) for c in choice_words) for w in query_words]
+        return min(scores) if scores else 0
+
+    def _rank(self, query, hits, limit):
+        query_words = [w for w in query.split() if w not in FILLER_WORDS] or query.split()
+        ranked = []
+        for i, score in hits:
+            coverage = self._coverage(query_words, self.choices[i])
+            if coverage >= FUZZY_WORD_CUTOFF:
+                ranked.append((-(score + coverage), -fuzz.ratio(query, self.choices[i]), i, score))
+        ranked.sort()
+        return [self.entries[i] + (score,) for _, _, i, score in ranked[:limit]]
+
+    def search(self, query, limit=FUZZY_TOP_K, score_cutoff=FUZZY_SCORE_CUTOFF):
+        query = utils.default_process(query)
+        if not query or not self.choices:
+            return []
+        hits = process.extract(
+            query, self.choices, scorer=fuzz.WRatio, limit=max(limit, FUZZY_CANDIDATES), score_cutoff=score_cutoff
+        )
+        return self._rank(query, [(i, score) for _, score, i in hits], limit)
+
+    def search_many(self, queries, limit=FUZZY_TOP_K, score_cutoff=FUZZY_SCORE_CUTOFF):
+        queries = [utils.default_process(q) for q in queries]
+        if not queries or not self.choices:
+            return [[] for _ in queries]
+        scores = process.cdist(
+            queries, self.choices, scorer=fuzz.WRatio,
+            score_cutoff=score_cutoff, workers=FUZZY_WORKERS,
+        )
+        results = []
+        for query, row in zip(queries, scores):
+            top = row.argsort()[::-1][:max(limit, FUZZY_CANDIDATES)]
+            results.append(self._rank(query, [(int(i), float(row[i])) for i in top if row[i]], limit))
+        return results
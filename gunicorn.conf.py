@@ -0,0 +1,44 @@
+import gc
+import os
+import tempfile
+import threading
+
+# gunicorn -c gunicorn.conf.py cmvprun:app
+bind = f"0.0.0.0:{os.getenv('PORT', 10000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+# Import cmvprun (catalog snapshot, indexes, rendered pages) once in the master; workers
+# inherit it through fork instead of each rebuilding it
+preload_app = True
+
+# Each worker has its own metrics registry; they meet in this directory so whichever worker
+# answers a /metrics scrape reports all of them (see metrics.py). Set before the app is preloaded.
+metrics_dir = os.environ.setdefault(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), f"tariqbot-metrics-{os.getpid()}"))
+
+
+def on_starting(server):
+    # Files left by a previous run would add its old counters to ours
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        os.unlink(os.path.join(metrics_dir, name))
+
+
+def pre_fork(server, worker):
+    # Objects allocated so far are shared with the workers; keep the GC from touching
+    # (and so copying) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # The catalog watcher and reply worker threads start lazily in each worker. A SQLite
+    # connection opened by the master must not cross the fork, so drop it here.
+    import cmvprun
+    backend = cmvprun.sessions.backend
+    if hasattr(backend, "local"):
+        backend.local = threading.local()
+    cmvprun.REGISTRY.start()
+    # Warm the OpenAI client in the background so the first LLM-bound message doesn't pay the import
+    threading.Thread(target=cmvprun.get_client, name="openai-warmup", daemon=True).start()
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 300))
+COALESCE_WINDOW = int(os.getenv("COALESCE_WINDOW", 5))
+SINGLE_FLIGHT_WAIT = float(os.getenv("SINGLE_FLIGHT_WAIT", 60))
+# How often a duplicate on another worker checks the shared backend for the leader's reply
+SINGLE_FLIGHT_POLL = float(os.getenv("SINGLE_FLIGHT_POLL", 0.1))
+
+
+def dedupe_keys(message_sid, sender, body, coalesce=True):
+    keys = [(f"idem:sid:{message_sid}", IDEMPOTENCY_TTL)] if message_sid else []
+    if coalesce and COALESCE_WINDOW > 0:
+        keys.append((f"idem:msg:{sender}:{' '.join(body.lower().split())}", COALESCE_WINDOW))
+    return keys
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def lock_key(key):
+    return key.replace("idem:", "idem:lock:", 1)
+
+
+class SingleFlight:
+    """Runs fn once per key: retries replay the stored result, concurrent duplicates wait on the first.
+
+    Within a process duplicates wait on an Event. Across workers the leader also claims
+    idem:lock:<key> in the backend, and a duplicate that finds it taken polls for the stored result.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.counts = {"executed": 0, "replayed": 0, "joined": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def do(self, keys, fn):
+        for key, _ in keys:
+            cached = self.backend.get_raw(key)
+            if cached is not None:
+                self._count("replayed")
+                return cached.decode("utf-8")
+
+        with self.lock:
+            call = next((self.calls[key] for key, _ in keys if key in self.calls), None)
+            leader = call is None
+            if leader:
+                call = _Call()
+                for key, _ in keys:
+                    self.calls[key] = call
+
+        if not leader:
+            self._count("joined")
+            if not call.done.wait(SINGLE_FLIGHT_WAIT):
+                raise TimeoutError("Timed out waiting for duplicate request to finish")
+            if call.error:
+                raise call.error
+            return call.result
+
+        claimed = []
+        try:
+            deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+            while True:
+                held = self._claim(keys, claimed)
+                if held is None:
+                    break
+                # Another worker is running it; its reply lands under the same key
+                result = self._await_remote(held, deadline)
+                if result is not None:
+                    self._count("joined")
+                    call.result = result
+                    return result
+            call.result = fn()
+            for key, ttl in keys:
+                self.backend.set_raw(key, call.result.encode("utf-8"), ttl)
+            self._count("executed")
+            return call.result
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            # After the result is stored, so a polling duplicate never sees neither
+            for key in claimed:
+                self.backend.delete(lock_key(key))
+            with self.lock:
+                for key, _ in keys:
+                    self.calls.pop(key, None)
+            call.done.set()
+
+    def _claim(self, keys, claimed):
+        """Claims every key's lock into `claimed`; on a conflict releases them and returns the held key."""
+        for key, _ in keys:
+            # Held at most as long as anyone waits for it, so a killed worker's claim lapses
+            if self.backend.add_raw(lock_key(key), b"1", SINGLE_FLIGHT_WAIT):
+                claimed.append(key)
+                continue
+            for mine in claimed:
+                self.backend.delete(lock_key(mine))
+            claimed.clear()
+            return key
+        return None
+
+    def _await_remote(self, key, deadline):
+        """The reply another worker stores under `key`, or None if it gave up without one."""
+        while time.monotonic() < deadline:
+            cached = self.backend.get_raw(key)
+            if cached is not None:
+                return cached.decode("utf-8")
+            if self.backend.get_raw(lock_key(key)) is None:
+                # The leader stores its reply before releasing the lock
+                cached = self.backend.get_raw(key)
+                return cached.decode("utf-8") if cached is not None else None
+            time.sleep(SINGLE_FLIGHT_POLL)
+        raise TimeoutError("Timed out waiting for duplicate request to finish")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, in_flight=len({id(c) for c in self.calls.values()}))
@@ -0,0 +1,46 @@
+import logging
+import re
+
+logger = logging.getLogger("TariqBot.router")
+
+
+class Intent:
+    __slots__ = ("name", "phrases", "handler", "priority", "exact")
+
+    def __init__(self, name, phrases, handler, priority, exact=False):
+        self.name = name
+        self.phrases = tuple(phrases)
+        self.handler = handler
+        self.priority = priority  # lower wins when several intents match
+        self.exact = exact  # only fires when the whole message is one of the phrases
+
+    def __repr__(self):
+        return f"Intent({self.name!r})"
+
+
+class IntentRouter:
+    """Compiles an intent table into one exact-match dict and one word-bounded regex."""
+
+    def __init__(self, intents):
+        self.exact = {}
+        self.by_phrase = {}
+        for intent in sorted(intents, key=lambda i: i.priority):
+            for phrase in intent.phrases:
+                phrase = " ".join(phrase.lower().split())
+                target = self.exact if intent.exact else self.by_phrase
+                target.setdefault(phrase, intent)
+        # Longest phrases first so "opening hours" wins over "hours" at the same position
+        alternatives = sorted(self.by_phrase, key=len, reverse=True)
+        body = "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in alternatives)
+        self.pattern = re.compile(rf"\b(?:{body})\b") if alternatives else None
+
+    def classify(self, message):
+        text = " ".join(message.lower().split())
+        intent = self.exact.get(text)
+        matched = [text] if intent else []
+        if intent is None and self.pattern:
+            matched = [" ".join(m.group(0).split()) for m in self.pattern.finditer(text)]
+            candidates = [self.by_phrase[p] for p in matched]
+            intent = min(candidates, key=lambda i: i.priority) if candidates else None
+        logger.debug(f"Intent {intent.name if intent else None} matched={matched} for {text!r}")
+        return intent
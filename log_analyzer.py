@@ -0,0 +1,181 @@
+"""Finds the LLM fall-through messages that new intents or catalog aliases would absorb.
+
+    python log_analyzer.py /var/log/tariqbot/conversations.jsonl [more.jsonl.gz ...] [--top 25] [--json]
+
+The log is written only when CONVERSATION_LOG names a file (see conversation_log.py).
+
+Reads the conversation log as a stream: memory stays bounded by --capacity clusters no
+matter how large the logs are, at the cost of approximate counts for the long tail.
+"""
+import argparse
+import gzip
+import json
+import sys
+from collections import Counter
+
+from rapidfuzz import fuzz, process
+
+from aliases import QUERY_FILLER
+from answer_cache import normalize_question
+from catalog_index import QUESTION_WORDS, STOPWORDS, tokenize
+
+LLM_ROUTES = {"llm", None}
+# An alias candidate is a short product-shaped message with exactly one word the catalog
+# doesn't know ("kaleji", "lamb paye"); "do you deliver to jersey" has two and is an intent
+ALIAS_MAX_WORDS = 2
+IGNORED_WORDS = STOPWORDS | QUESTION_WORDS | QUERY_FILLER
+# Only a close spelling counts as "near" a catalog word ("mutten" -> "mutton", not "spicy")
+NEAREST_CUTOFF = 80
+
+
+def read_records(paths):
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn final line of a log still being written
+
+
+def fall_throughs(records):
+    for record in records:
+        if record.get("route") in LLM_ROUTES and record.get("body"):
+            yield record
+
+
+def cluster_key(body):
+    return normalize_question(body) or " ".join(body.lower().split())
+
+
+class Cluster:
+    __slots__ = ("key", "count", "error", "tokens", "latency_ms", "models", "examples")
+
+    def __init__(self, key, error=0):
+        self.key = key
+        self.count = 0
+        self.error = error  # upper bound on messages missed before this cluster was (re)admitted
+        self.tokens = 0
+        self.latency_ms = 0.0
+        self.models = Counter()
+        self.examples = Counter()
+
+
+class ClusterCounter:
+    """Lossy top-k counting: once past 2x capacity, keep only the `capacity` largest clusters."""
+
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self.clusters = {}
+        self.floor = 0  # largest count dropped so far
+        self.total = 0
+
+    def add(self, record):
+        key = cluster_key(record["body"])
+        cluster = self.clusters.get(key)
+        if cluster is None:
+            cluster = self.clusters[key] = Cluster(key, error=self.floor)
+            if len(self.clusters) > 2 * self.capacity:
+                self._prune()
+                cluster = self.clusters.setdefault(key, cluster)
+        cluster.count += 1
+        cluster.tokens += (record.get("prompt_tokens") or 0) + (record.get("completion_tokens") or 0)
+        cluster.latency_ms += record.get("latency_ms") or 0
+        cluster.models[record.get("model") or "unknown"] += 1
+        if len(cluster.examples) < 5 or record["body"] in cluster.examples:
+            cluster.examples[record["body"]] += 1
+        self.total += 1
+
+    def _prune(self):
+        ranked = sorted(self.clusters.values(), key=lambda c: c.count, reverse=True)
+        self.floor = max(self.floor, ranked[self.capacity].count)
+        self.clusters = {c.key: c for c in ranked[:self.capacity]}
+
+    def top(self, n, by="tokens"):
+        key = (lambda c: (c.tokens, c.count)) if by == "tokens" else (lambda c: (c.count, c.tokens))
+        return sorted(self.clusters.values(), key=key, reverse=True)[:n]
+
+
+def catalog_vocabulary():
+    from catalog_store import CatalogStore
+    return list(CatalogStore(poll_interval=0, snapshot_file="").current.index.tokens)
+
+
+def suggest(cluster, vocabulary):
+    """('alias' or 'intent', closest catalog word) for a cluster of fall-through messages.
+
+    Judged on the most common raw message, not the normalized key, which has dropped the
+    words that tell "do you deliver to jersey" from a product name.
+    """
+    body = cluster.examples.most_common(1)[0][0] if cluster.examples else cluster.key
+    words = [w for w in tokenize(body) if len(w) > 2 and w not in IGNORED_WORDS]
+    known = set(vocabulary)
+    unknown = [w for w in words if w not in known]
+    if not known or len(words) > ALIAS_MAX_WORDS or len(unknown) != 1 or not unknown[0].isalpha():
+        return "intent", None
+    match = process.extractOne(unknown[0], vocabulary, scorer=fuzz.ratio, score_cutoff=NEAREST_CUTOFF)
+    return "alias", match[0] if match else None
+
+
+def analyze(paths, top=25, capacity=5000, by="tokens", use_catalog=True):
+    seen = 0
+    counter = ClusterCounter(capacity)
+
+    def counted(records):
+        nonlocal seen
+        for record in records:
+            seen += 1
+            yield record
+
+    for record in fall_throughs(counted(read_records(paths))):
+        counter.add(record)
+    vocabulary = catalog_vocabulary() if use_catalog else []
+    return {
+        "messages": seen,
+        "fall_throughs": counter.total,
+        "fall_through_rate": round(counter.total / seen, 3) if seen else 0.0,
+        "clusters": [
+            {
+                "key": c.key,
+                "count": c.count,
+                "count_error": c.error,
+                "share": round(c.count / counter.total, 4) if counter.total else 0.0,
+                "tokens": c.tokens,
+                "avg_latency_ms": round(c.latency_ms / c.count, 1) if c.count else 0.0,
+                "models": dict(c.models),
+                "examples": [text for text, _ in c.examples.most_common(3)],
+                "suggest": kind,
+                "nearest_catalog_word": nearest,
+            }
+            for c in counter.top(top, by)
+            for kind, nearest in [suggest(c, vocabulary)]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--capacity", type=int, default=5000, help="clusters kept in memory")
+    parser.add_argument("--by", choices=("tokens", "count"), default="tokens", help="rank clusters by LLM spend or volume")
+    parser.add_argument("--no-catalog", action="store_true", help="skip alias/intent suggestions")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = analyze(args.paths, args.top, args.capacity, args.by, not args.no_catalog)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+    print(f"{report['fall_throughs']} of {report['messages']} messages fell through to the LLM "
+          f"({report['fall_through_rate']:.1%})")
+    for c in report["clusters"]:
+        print(f"{c['count']:6d}  {c['share']:6.1%}  {c['tokens']:8d} tok  {c['avg_latency_ms']:7.0f} ms  "
+              f"{c['suggest']:6}  {c['key']!r}  e.g. {c['examples'][0]!r}"
+              + (f"  (near {c['nearest_catalog_word']!r})" if c["nearest_catalog_word"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger("TariqBot.metrics")
+
+# Each gunicorn worker keeps its own registry. With METRICS_DIR set, workers write their values
+# there every METRICS_FLUSH_INTERVAL seconds and /metrics merges all of them, so a scrape that
+# lands on any worker reports the whole server; other workers' numbers lag by up to one interval.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+# Seconds; spans sub-millisecond deterministic routes up to LLM calls near the reply deadline
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(k, "") for k in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def state(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+    def samples(self, values=None):
+        if values is None:
+            with self.lock:
+                values = dict(self.values)
+        for key, value in values.items():
+            yield self.name, format_labels(self.labels, key), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(k, "") for k in self.labels)
+        slot = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def state(self):
+        with self.lock:
+            return [[list(key), list(values)] for key, values in self.series.items()]
+
+    @staticmethod
+    def merge(total, values):
+        return list(values) if total is None else [a + b for a, b in zip(total, values)]
+
+    def samples(self, series=None):
+        if series is None:
+            with self.lock:
+                series = {key: list(values) for key, values in self.series.items()}
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                yield f"{self.name}_bucket", format_labels(self.labels, key, [("le", format_value(bound))]), cumulative
+            yield f"{self.name}_sum", format_labels(self.labels, key), values[-1]
+            yield f"{self.name}_count", format_labels(self.labels, key), cumulative
+
+
+class StatsCounter(Counter):
+    """One cumulative field of an existing stats() dict, exported as <prefix>_<field>_total."""
+
+    def __init__(self, prefix, field, stats):
+        label = f"{prefix.split('_', 1)[-1]} {field}".replace("_", " ")
+        super().__init__(f"{prefix}_{field}_total", f"{label.capitalize()}, summed over workers")
+        self.field = field
+        self.stats = stats
+
+    def state(self):
+        return [[[], self.stats().get(self.field, 0)]]
+
+    def samples(self, values=None):
+        if values is None:
+            values = {(): self.stats().get(self.field, 0)}
+        return super().samples(values)
+
+
+class StatsGauges:
+    """Exposes the remaining numeric fields of an existing stats() dict as gauges at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, prefix, stats, skip=()):
+        self.prefix = prefix
+        self.stats = stats
+        self.skip = set(skip)
+
+    def families(self):
+        for field, value in self.stats().items():
+            if field not in self.skip and isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{self.prefix}_{field}", value
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self, directory=METRICS_DIR, interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.metrics = []
+        self.gauges = []
+        self.flusher = None
+        self.lock = threading.Lock()
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self, prefix, stats, counters=()):
+        """Exports a stats() dict: `counters` names its cumulative fields, which are summed
+        across workers; every other numeric field is a per-worker gauge."""
+        for field in counters:
+            self.metrics.append(StatsCounter(prefix, field, stats))
+        self.gauges.append(StatsGauges(prefix, stats, skip=counters))
+
+    def state(self):
+        return {
+            "metrics": {metric.name: metric.state() for metric in self.metrics},
+            "gauges": [[name, value] for gauges in self.gauges for name, value in gauges.families()],
+        }
+
+    def flush(self):
+        """Writes this process's values to METRICS_DIR/<pid>.json for the other workers to merge."""
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.state(), f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Metrics flush failed")
+
+    def start(self):
+        """Starts flushing in this process; call once per worker, after the fork."""
+        if not self.directory:
+            return
+        with self.lock:
+            if self.flusher and self.flusher.is_alive():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self.flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self.flusher.start()
+
+    def collect(self):
+        """pid -> state for this process and every worker that has flushed to METRICS_DIR."""
+        pid = os.getpid()
+        states = {pid: self.state()}
+        if not self.directory:
+            return states
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return states
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext != ".json" or not stem.isdigit() or int(stem) == pid:
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    states[int(stem)] = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Skipping unreadable metrics file {name}")
+        return states
+
+    def render(self):
+        states = self.collect()
+        lines = []
+        for metric in self.metrics:
+            # Counters and histograms add up across workers, including ones that have since
+            # exited, so totals never go backwards when gunicorn recycles a worker
+            merged = {}
+            for state in states.values():
+                for key, value in state["metrics"].get(metric.name, ()):
+                    key = tuple(key)
+                    merged[key] = metric.merge(merged.get(key), value)
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in metric.samples(merged))
+        # Gauges describe one process (queue depth, cache size), so each live worker gets its own series
+        families = {}
+        for pid, state in sorted(states.items()):
+            if pid != os.getpid() and not alive(pid):
+                continue
+            for name, value in state["gauges"]:
+                families.setdefault(name, []).append((pid, value))
+        for name, series in families.items():
+            lines.append(f"# HELP {name} {name.split('_', 1)[-1].replace('_', ' ').capitalize()}, per worker")
+            lines.append(f"# TYPE {name} gauge")
+            for pid, value in series:
+                labels = format_labels(("worker",), (pid,)) if self.directory else ""
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
@@ -0,0 +1,138 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("TariqBot.models")
+
+PRIMARY_MODEL = os.getenv("PRIMARY_MODEL", "gpt-4")
+FALLBACK_MODEL = os.getenv("FALLBACK_MODEL", "gpt-3.5-turbo")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 500))
+LLM_MIN_TOKENS = int(os.getenv("LLM_MIN_TOKENS", 150))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))
+# Twilio gives up on a webhook after 15s; leave room for the reply delay and network
+SYNC_DEADLINE = float(os.getenv("SYNC_DEADLINE", 12))
+# In-flight LLM calls per process: downgrade from the soft limit, stop calling at the hard limit
+LLM_SOFT_LIMIT = int(os.getenv("LLM_SOFT_LIMIT", 4))
+LLM_HARD_LIMIT = int(os.getenv("LLM_HARD_LIMIT", 8))
+# Recent latency above this sends new calls to the fallback model
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", 8))
+LLM_LATENCY_PRIOR = float(os.getenv("LLM_LATENCY_PRIOR", 4))
+EWMA_ALPHA = float(os.getenv("LLM_EWMA_ALPHA", 0.2))
+# A model that isn't being called gets no new samples, so its estimate drifts back to the prior
+# with this half-life; one slow call can't keep the primary model downgraded for good
+LLM_LATENCY_HALF_LIFE = float(os.getenv("LLM_LATENCY_HALF_LIFE", 60))
+
+
+class Decision:
+    __slots__ = ("model", "max_tokens", "timeout", "reason")
+
+    def __init__(self, model, max_tokens, timeout, reason):
+        self.model = model  # None means answer deterministically
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.reason = reason
+
+    @property
+    def fallback(self):
+        return self.model is None
+
+    def __repr__(self):
+        return f"Decision({self.model!r}, {self.max_tokens}, {self.timeout:.1f}s, {self.reason!r})"
+
+
+class ModelRouter:
+    """Picks model, token budget and timeout per call from in-flight load, recent latency and the deadline."""
+
+    def __init__(self, primary=PRIMARY_MODEL, fallback=FALLBACK_MODEL, soft_limit=LLM_SOFT_LIMIT,
+                 hard_limit=LLM_HARD_LIMIT, latency_target=LLM_LATENCY_TARGET, timeout=LLM_TIMEOUT,
+                 max_tokens=LLM_MAX_TOKENS, min_tokens=LLM_MIN_TOKENS):
+        self.primary = primary
+        self.fallback = fallback
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.latency_target = latency_target
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency = {}  # model -> (EWMA seconds per call, time of the last sample)
+        self.counts = {"primary": 0, "downgraded": 0, "shrunk": 0, "deterministic": 0, "failures": 0}
+
+    def expected(self, model, now=None):
+        sample = self.latency.get(model)
+        if sample is None:
+            return LLM_LATENCY_PRIOR
+        seconds, updated = sample
+        age = (time.monotonic() if now is None else now) - updated
+        weight = 0.5 ** (age / LLM_LATENCY_HALF_LIFE) if LLM_LATENCY_HALF_LIFE > 0 else 1.0
+        return LLM_LATENCY_PRIOR + (seconds - LLM_LATENCY_PRIOR) * weight
+
+    def overloaded(self, queued=0):
+        return self.in_flight + queued >= self.hard_limit
+
+    def choose(self, preferred=None, remaining=None):
+        """Decides under the lock and, for an LLM decision, reserves its in-flight slot; the
+        caller must run the call inside track(decision), which releases it."""
+        budget = min(self.timeout, remaining) if remaining is not None else self.timeout
+        with self.lock:
+            model, max_tokens, reason, detail = self._route(preferred or self.primary, budget)
+            self.counts[reason] += 1
+            if model is not None:
+                self.in_flight += 1
+        if reason != "primary":
+            logger.info(f"Model routing {reason}: {model or 'none'} max_tokens={max_tokens} {detail}".rstrip())
+        return Decision(model, max_tokens, budget, reason)
+
+    def _route(self, model, budget):
+        if self.overloaded():
+            return None, 0, "deterministic", f"{self.in_flight} calls in flight"
+
+        reason = "primary"
+        if model != self.fallback and (
+            self.in_flight >= self.soft_limit
+            or self.expected(model) > min(self.latency_target, budget)
+        ):
+            model, reason = self.fallback, "downgraded"
+
+        # Generation time scales with output length, so cut max_tokens to what fits the budget
+        max_tokens = self.max_tokens
+        expected = self.expected(model)
+        if expected > budget:
+            max_tokens = int(self.max_tokens * budget / expected)
+            if max_tokens < self.min_tokens:
+                return None, 0, "deterministic", f"{budget:.1f}s left, {model} needs {expected:.1f}s"
+            reason = "shrunk"
+        return model, max_tokens, reason, ""
+
+    @contextmanager
+    def track(self, decision):
+        start = time.perf_counter()
+        elapsed = None
+        try:
+            yield
+            elapsed = time.perf_counter() - start
+        except Exception:
+            # Timeouts and errors count as a call that took the whole budget
+            elapsed = max(time.perf_counter() - start, decision.timeout)
+            with self.lock:
+                self.counts["failures"] += 1
+            raise
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                now = time.monotonic()
+                previous = self.latency.get(decision.model)
+                self.latency[decision.model] = (elapsed if previous is None else (
+                    EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.expected(decision.model, now)
+                ), now)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts, in_flight=self.in_flight)
+            for model in self.latency:
+                stats[f"latency_{re.sub(r'[^a-z0-9]+', '_', model.lower())}"] = round(self.expected(model), 3)
+            return stats
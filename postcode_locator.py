@@ -0,0 +1,96 @@
+import csv
+import math
+import os
+import re
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+OUTCODES_FILE = os.path.join(DATA_DIR, "outcodes.csv")
+BRANCH_LOCATIONS_FILE = os.path.join(DATA_DIR, "branch_locations.csv")
+NEAREST_BRANCHES = int(os.getenv("NEAREST_BRANCHES", 3))
+EARTH_RADIUS_KM = 6371.0
+
+# Outward code, optionally followed by the inward half ("HA9", "e17", "SW1A 1AA", "ha90ws")
+POSTCODE_RE = re.compile(r"\b([a-z]{1,2}[0-9][0-9a-z]?)\s*(?:[0-9][a-z]{2})?\b", re.I)
+
+
+def read_points(path, key):
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row[key]: (float(row["lat"]), float(row["lon"])) for row in csv.DictReader(f)}
+
+
+def to_vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+class KDTree:
+    """3-d tree over unit-sphere vectors; chord length orders points the same as great-circle distance."""
+
+    def __init__(self, points):
+        # points: [(vector, payload)]
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        return (points[mid], axis, self._build(points[:mid], depth + 1), self._build(points[mid + 1:], depth + 1))
+
+    def nearest(self, target, k):
+        best = []  # sorted [(squared chord, payload)], at most k long
+
+        def visit(node):
+            if node is None:
+                return
+            (vector, payload), axis, left, right = node
+            dist = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if len(best) < k or dist < best[-1][0]:
+                best.append((dist, payload))
+                best.sort(key=lambda item: item[0])
+                del best[k:]
+            diff = target[axis] - vector[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(best) < k or diff * diff < best[-1][0]:
+                visit(far)
+
+        visit(self.root)
+        return [payload for _, payload in best]
+
+
+class PostcodeLocator:
+    def __init__(self, branches, outcodes_file=OUTCODES_FILE, locations_file=BRANCH_LOCATIONS_FILE):
+        self.outcodes = read_points(outcodes_file, "outcode")
+        located = read_points(locations_file, "branch")
+        self.branches = {name: located[name] for name in branches if name in located}
+        self.tree = KDTree((to_vector(*coords), name) for name, coords in self.branches.items())
+
+    def resolve(self, message):
+        # Full outcode first, then its postcode area ("SW1A" -> "SW1" -> "SW")
+        for match in POSTCODE_RE.finditer(message):
+            outcode = match.group(1).upper()
+            district = outcode[:-1] if outcode[-1].isalpha() else outcode
+            area = re.match(r"[A-Z]+", outcode).group(0)
+            for code in (outcode, district, area):
+                if code in self.outcodes:
+                    return code, self.outcodes[code]
+        return None
+
+    def nearest(self, coords, n=NEAREST_BRANCHES):
+        names = self.tree.nearest(to_vector(*coords), n)
+        return [(name, haversine_km(coords, self.branches[name])) for name in names]
+
+    def nearest_to(self, message, n=NEAREST_BRANCHES):
+        resolved = self.resolve(message)
+        if resolved is None:
+            return None
+        code, coords = resolved
+        return code, self.nearest(coords, n)
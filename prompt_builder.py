@@ -0,0 +1,123 @@
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+from rapidfuzz import process
+
+from catalog_index import tokenize
+
+PROMPT_MODE = os.getenv("PROMPT_MODE", "full")  # "full" or "retrieval"
+PROMPT_TOP_N = int(os.getenv("PROMPT_TOP_N", 25))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 600))
+PROMPT_HISTORY_TURNS = 2
+CHARS_PER_TOKEN = 4
+
+INTRO = (
+    "You are the helpful WhatsApp assistant for Tariq Halal Meat Shop UK.\n"
+    "Answer using store info and product catalog.\n"
+)
+
+# version -> (store prefix, full catalog listing); shared by every builder of the same data.
+# Holds the live version and the one before it, so requests finishing on the old snapshot
+# during a reload don't rebuild it, and a long-running process doesn't keep every edit.
+_PREFIX_CACHE = {}
+PREFIX_CACHE_VERSIONS = 2
+_PREFIX_LOCK = threading.Lock()
+
+
+def catalog_version(catalog, info):
+    payload = json.dumps([catalog, info], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_store_info(info):
+    return "\n".join(f"{k.replace('_', ' ').title()}: {v}" for k, v in info.items())
+
+
+def format_product_line(product):
+    return f"• {product['name']}: {product['price']}"
+
+
+def format_product_catalog(catalog):
+    lines = []
+    for category, products in catalog.items():
+        lines.append(f"\n🛒 {category.title()}:")
+        lines.extend(format_product_line(product) for product in products)
+    return "\n".join(lines)
+
+
+class PromptBuilder:
+    def __init__(self, catalog, info, index, mode=PROMPT_MODE,
+                 top_n=PROMPT_TOP_N, token_budget=PROMPT_TOKEN_BUDGET):
+        self.catalog = catalog
+        self.info = info
+        self.index = index
+        self.mode = mode
+        self.top_n = top_n
+        self.token_budget = token_budget
+        self.version = catalog_version(catalog, info)
+        self.vocabulary = list(index.tokens)
+        total = len(index.records) or 1
+        self.idf = {token: math.log(1 + total / len(rids)) for token, rids in index.tokens.items()}
+
+    def _prefix(self):
+        cached = _PREFIX_CACHE.get(self.version)
+        if cached is None:
+            store = f"{INTRO}\nSTORE INFO:\n{format_store_info(self.info)}\n"
+            cached = (store, format_product_catalog(self.catalog))
+            with _PREFIX_LOCK:
+                while len(_PREFIX_CACHE) >= PREFIX_CACHE_VERSIONS:
+                    # Dicts keep insertion order, so the first key is the oldest version
+                    del _PREFIX_CACHE[next(iter(_PREFIX_CACHE))]
+                _PREFIX_CACHE[self.version] = cached
+        return cached
+
+    def _query_tokens(self, message, memory):
+        texts = [message] + [h['user'] for h in memory[-PROMPT_HISTORY_TURNS:]]
+        tokens = []
+        for token in (t for text in texts for t in tokenize(text) if len(t) >= 3):
+            if token in self.idf:
+                tokens.append(token)
+                continue
+            # Typo tolerance: map unknown words onto the closest catalog token
+            match = process.extractOne(token, self.vocabulary, score_cutoff=85)
+            if match:
+                tokens.append(match[0])
+        return tokens
+
+    def relevant_products(self, message, memory=()):
+        scores = Counter()
+        for token in self._query_tokens(message, memory):
+            for rid in self.index.tokens[token]:
+                scores[rid] += self.idf[token]
+        return [self.index.records[rid] for rid, _ in scores.most_common(self.top_n)]
+
+    def retrieval_section(self, message, memory=()):
+        lines = ["Categories: " + ", ".join(c.title() for c in self.catalog)]
+        budget = self.token_budget - estimate_tokens(lines[0])
+        seen = set()
+        for product, category in self.relevant_products(message, memory):
+            line = f"{format_product_line(product)} ({category.title()})"
+            cost = estimate_tokens(line)
+            if line in seen or cost > budget:
+                continue
+            seen.add(line)
+            lines.append(line)
+            budget -= cost
+        return "\n".join(lines)
+
+    def system_prompt(self, message, memory=()):
+        store, full_catalog = self._prefix()
+        if self.mode != "retrieval":
+            return f"{store}\nPRODUCT CATALOG:\n{full_catalog}"
+        return (
+            f"{store}\nRELEVANT PRODUCTS (subset of the catalog, ask for a category to see more):\n"
+            f"{self.retrieval_section(message, memory)}"
+        )
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+logger = logging.getLogger("TariqBot.ratelimit")
+
+# Messages per sender: bursts of RATE_LIMIT_BURST, refilled at RATE_LIMIT_PER_MINUTE; 0 disables
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 10))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", 20))
+# LLM calls per sender; past this a sender still gets catalog answers, just not GPT ones
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", 4))
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", 6))
+# LLM calls in flight from everyone together, across workers when the backend is shared; 0 disables.
+# LLM_HARD_LIMIT still caps each process on top of this.
+LLM_GLOBAL_CONCURRENCY = int(os.getenv("LLM_GLOBAL_CONCURRENCY", 12))
+# Each slot lapses this long after it was taken, so a worker killed mid-call can't hold it for
+# good; keep it above the longest LLM call (LLM_TIMEOUT)
+LLM_SLOT_TTL = float(os.getenv("LLM_SLOT_TTL", 60))
+LLM_SLOTS_KEY = "rate:llm_in_flight"
+
+THROTTLE_MESSAGE = ("You're sending messages faster than we can answer them. "
+                    "Please wait a minute and try again.")
+LOCK_STRIPES = 16
+
+
+class TokenBucket:
+    """Token buckets kept in the cache store, so workers sharing Redis or SQLite share the limit.
+
+    The read-modify-write is only atomic within a process; across workers a race can let an
+    extra message through, which is fine for abuse protection.
+    """
+
+    def __init__(self, backend, prefix, burst, per_minute):
+        self.backend = backend
+        self.prefix = prefix
+        self.burst = burst
+        self.rate = per_minute / 60
+        # An idle bucket is full again after burst / rate seconds; its key can expire by then
+        self.ttl = burst / self.rate + 60 if self.enabled else 0
+        self.locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @property
+    def enabled(self):
+        return self.burst > 0 and self.rate > 0
+
+    def take(self, key, now=None):
+        """Spends one token; returns 0 if allowed, else how many refusals in a row this is."""
+        now = time.time() if now is None else now
+        key = f"{self.prefix}:{key}"
+        with self.locks[zlib.crc32(key.encode("utf-8")) % LOCK_STRIPES]:
+            raw = self.backend.get_raw(key)
+            tokens, stamp, refused = json.loads(raw) if raw is not None else (self.burst, now, 0)
+            tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+            if tokens >= 1:
+                tokens, refused = tokens - 1, 0
+            else:
+                refused += 1
+            state = [round(tokens, 3), round(now, 3), refused]
+            self.backend.set_raw(key, json.dumps(state, separators=(",", ":")).encode("utf-8"), self.ttl)
+        return refused
+
+
+class RateLimiter:
+    """Per-sender message and LLM buckets plus a global cap on LLM calls in flight; fails open if the backend does."""
+
+    def __init__(self, backend, burst=RATE_LIMIT_BURST, per_minute=RATE_LIMIT_PER_MINUTE,
+                 llm_burst=LLM_RATE_BURST, llm_per_minute=LLM_RATE_PER_MINUTE,
+                 llm_concurrency=LLM_GLOBAL_CONCURRENCY):
+        self.backend = backend
+        self.messages = TokenBucket(backend, "rate:msg", burst, per_minute)
+        self.llm = TokenBucket(backend, "rate:llm", llm_burst, llm_per_minute)
+        self.llm_concurrency = llm_concurrency
+        self.lock = threading.Lock()
+        self.slots_held = 0
+        self.counts = {"allowed": 0, "throttled": 0, "dropped": 0, "llm_allowed": 0,
+                       "llm_limited": 0, "llm_global_limited": 0, "errors": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _failed(self, what):
+        self._count("errors")
+        logger.warning(f"Rate limit check failed for {what}, allowing", exc_info=self.counts["errors"] == 1)
+
+    def _take(self, bucket, key):
+        if not bucket.enabled:
+            return 0
+        try:
+            return bucket.take(key)
+        except Exception:
+            self._failed(bucket.prefix)
+            return 0
+
+    def _acquire_slot(self):
+        """A slot token, False when every slot is held, or None when the cap is off or unreachable."""
+        if self.llm_concurrency <= 0:
+            return None
+        try:
+            return self.backend.acquire_slot(LLM_SLOTS_KEY, self.llm_concurrency, LLM_SLOT_TTL) or False
+        except Exception:
+            self._failed(LLM_SLOTS_KEY)
+            return None
+
+    def _release_slot(self, token):
+        try:
+            self.backend.release_slot(LLM_SLOTS_KEY, token)
+        except Exception:
+            self._failed(LLM_SLOTS_KEY)
+
+    def check_message(self, sender):
+        """'allow', 'throttle' (first refusal: tell the sender) or 'drop' (already told: stay quiet)."""
+        refused = self._take(self.messages, sender)
+        verdict = "allow" if not refused else "throttle" if refused == 1 else "drop"
+        self._count({"allow": "allowed", "throttle": "throttled", "drop": "dropped"}[verdict])
+        if refused == 1:
+            logger.warning(f"Throttling {sender}: over {self.messages.burst} messages")
+        return verdict
+
+    @contextmanager
+    def llm_slot(self, sender):
+        """Yields None while holding a global LLM slot, else the routing reason for answering without it.
+
+        The slot is taken first, so a sender turned away by the global cap keeps their own token.
+        """
+        acquired = self._acquire_slot()
+        if acquired is False:
+            self._count("llm_global_limited")
+            yield "global_concurrency"
+            return
+        try:
+            if acquired:
+                with self.lock:
+                    self.slots_held += 1
+            if sender and self._take(self.llm, sender):
+                self._count("llm_limited")
+                yield "rate_limited"
+                return
+            self._count("llm_allowed")
+            yield None
+        finally:
+            if acquired:
+                with self.lock:
+                    self.slots_held -= 1
+                self._release_slot(acquired)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, llm_slots_held=self.slots_held, llm_concurrency=self.llm_concurrency)
@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # "memory", "redis" or "sqlite"
+SESSION_URL = os.getenv("SESSION_URL", "redis://localhost:6379/0")
+SESSION_DB = os.getenv("SESSION_DB", "sessions.sqlite3")
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 10000))
+# Dedupe and rate-limit keys: short-lived, several per message, kept apart from sessions
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 50000))
+HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", 5))
+
+
+def new_session():
+    return {"history": [], "last": datetime.utcnow()}
+
+
+def encode_session(session):
+    # Compact wire form: [[user, bot], ...] pairs, a unix timestamp and the listing being paged, if any
+    turns = [[h['user'], h['bot']] for h in session['history'][-HISTORY_TURNS:]]
+    payload = {"h": turns, "t": session['last'].timestamp()}
+    paging = session.get('paging')
+    if paging and 'query' in paging:
+        payload["q"] = [paging['route'], paging['query'], paging['page']]
+    elif paging:
+        payload["p"] = [paging['category'], paging['page']]
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def decode_session(raw):
+    payload = json.loads(raw)
+    session = {
+        "history": [{"user": user, "bot": bot} for user, bot in payload["h"]],
+        "last": datetime.fromtimestamp(payload["t"]),
+    }
+    if "p" in payload:
+        session["paging"] = {"category": payload["p"][0], "page": payload["p"][1]}
+    if "q" in payload:
+        session["paging"] = {"route": payload["q"][0], "query": payload["q"][1], "page": payload["q"][2]}
+    return session
+
+
+class MemorySessionStore:
+    """Per-process store bounded by entry count (LRU) and TTL."""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.slots = {}  # key -> {token: acquired}
+        self.lock = threading.Lock()
+
+    def get_raw(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set_raw(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            self._store(key, value, now + ttl, now)
+
+    def _store(self, key, value, expires, now):
+        self.entries[key] = (value, expires)
+        self.entries.move_to_end(key)
+        # Expired entries at the cold end go first, so they don't hold slots until read
+        while self.entries:
+            oldest = next(iter(self.entries.values()))
+            if oldest[1] >= now and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
+
+    def add_raw(self, key, value, ttl):
+        """Stores `value` only if `key` is absent or expired; True if it did."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] >= now:
+                return False
+            self._store(key, value, now + ttl, now)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def acquire_slot(self, key, cap, ttl):
+        """Takes one of `cap` slots at `key`; a token for release_slot, or None if all are held.
+
+        Each slot lapses `ttl` seconds after it was taken, so one leaked by a killed worker
+        frees itself however busy the key stays.
+        """
+        now = time.time()
+        with self.lock:
+            held = {t: at for t, at in self.slots.get(key, {}).items() if at >= now - ttl}
+            self.slots[key] = held
+            if len(held) >= cap:
+                return None
+            token = uuid.uuid4().hex
+            held[token] = now
+            return token
+
+    def release_slot(self, key, token):
+        with self.lock:
+            self.slots.get(key, {}).pop(token, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisSessionStore:
+    """Shared store on any Redis-protocol server (Redis, Valkey, KeyDB, Dragonfly).
+
+    Needs the optional redis package (pip install "redis>=5.0"), imported only for SESSION_BACKEND=redis.
+    """
+
+    def __init__(self, url=SESSION_URL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get_raw(self, key):
+        return self.client.get(key)
+
+    def set_raw(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def add_raw(self, key, value, ttl):
+        return bool(self.client.set(key, value, ex=max(1, int(ttl)), nx=True))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    # A sorted set of slot tokens scored by when they were taken; lapsed ones are pruned first
+    ACQUIRE_SLOT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1] - ARGV[3])
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then return 0 end
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], math.ceil(ARGV[3]))
+    return 1
+    """
+
+    def acquire_slot(self, key, cap, ttl):
+        token = uuid.uuid4().hex
+        # Runs as one script, so the prune, check and add are atomic across workers
+        if self.client.eval(self.ACQUIRE_SLOT, 1, key, time.time(), cap, ttl, token):
+            return token
+        return None
+
+    def release_slot(self, key, token):
+        self.client.zrem(key, token)
+
+    def __len__(self):
+        return self.client.dbsize()
+
+
+class SQLiteSessionStore:
+    """Single-file store shared by every worker on one host."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path=SESSION_DB):
+        self.path = path
+        self.local = threading.local()
+        self.writes = 0
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slots "
+                "(key TEXT NOT NULL, token TEXT NOT NULL, acquired REAL NOT NULL, PRIMARY KEY (key, token))"
+            )
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    def get_raw(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM sessions WHERE key = ? AND expires >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_raw(self, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, now + ttl),
+            )
+            self.writes += 1
+            if self.writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def add_raw(self, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE key = ? AND expires < ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO sessions (key, value, expires) VALUES (?, ?, ?)", (key, value, now + ttl)
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def acquire_slot(self, key, cap, ttl):
+        now = time.time()
+        token = uuid.uuid4().hex
+        # The prune takes the write lock, so the count and insert are atomic across processes
+        with self._conn() as conn:
+            conn.execute("DELETE FROM slots WHERE key = ? AND acquired < ?", (key, now - ttl))
+            held = conn.execute("SELECT COUNT(*) FROM slots WHERE key = ?", (key,)).fetchone()[0]
+            if held >= cap:
+                return None
+            conn.execute("INSERT INTO slots (key, token, acquired) VALUES (?, ?, ?)", (key, token, now))
+            return token
+
+    def release_slot(self, key, token):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM slots WHERE key = ? AND token = ?", (key, token))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, key):
+        raw = self.backend.get_raw(key)
+        return decode_session(raw) if raw is not None else None
+
+    def set(self, key, session, timeout):
+        self.backend.set_raw(key, encode_session(session), timeout)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+
+BACKENDS = {"memory": MemorySessionStore, "redis": RedisSessionStore, "sqlite": SQLiteSessionStore}
+
+
+def make_session_store(kind=SESSION_BACKEND):
+    return SessionStore(BACKENDS[kind]())
+
+
+def make_cache_store(sessions, kind=SESSION_BACKEND):
+    """Backend for idem:* and rate:* keys. In memory they get their own LRU so a burst of
+    messages can't evict customer sessions; Redis and SQLite expire by TTL, not by count,
+    so those share the session backend and its connection."""
+    if kind == "memory":
+        return MemorySessionStore(max_entries=CACHE_MAX_ENTRIES)
+    return sessions.backend
@@ -0,0 +1,84 @@
+import os
+import re
+
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "0") == "1"
+# WhatsApp caps a message at 1600 characters; stop well before that
+STREAM_CHAR_BUDGET = int(os.getenv("STREAM_CHAR_BUDGET", 900))
+# Past this length the reply ends at the next sentence boundary
+STREAM_SOFT_CHARS = int(os.getenv("STREAM_SOFT_CHARS", 600))
+# Async delivery sends the first complete sentences once they reach this length (0 disables)
+STREAM_FIRST_CHUNK = int(os.getenv("STREAM_FIRST_CHUNK", 160))
+
+SENTENCE_END_RE = re.compile(r"[.!?…](?=\s)|\n\n")
+
+
+def last_boundary(text):
+    ends = [m.end() for m in SENTENCE_END_RE.finditer(text)]
+    return ends[-1] if ends else None
+
+
+def next_boundary(text, at):
+    # A boundary ending at or after `at` starts at most two characters before it
+    for m in SENTENCE_END_RE.finditer(text, max(at - 2, 0)):
+        if m.end() >= at:
+            return m.end()
+    return None
+
+
+class StreamedReply:
+    """Result of consuming a completion stream; `usage` is only set when the stream ran to the end."""
+
+    __slots__ = ("text", "cut", "usage", "first_chunk", "received_chars")
+
+    def __init__(self, text, cut, usage, first_chunk, received_chars=0):
+        self.text = text
+        self.cut = cut
+        self.usage = usage
+        self.first_chunk = first_chunk
+        self.received_chars = received_chars  # everything generated before the close, kept or not
+
+
+class EstimatedUsage:
+    """Token counts guessed from text length for a stream closed before its final usage chunk."""
+
+    __slots__ = ("prompt_tokens", "completion_tokens")
+
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+def consume_stream(stream, char_budget=STREAM_CHAR_BUDGET, soft_chars=STREAM_SOFT_CHARS,
+                   first_chunk=STREAM_FIRST_CHUNK, on_first_chunk=None):
+    parts, length, usage, cut, sent = [], 0, None, False, None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            parts.append(chunk.choices[0].delta.content)
+            length += len(parts[-1])
+
+            if on_first_chunk and first_chunk and sent is None and length >= first_chunk:
+                text = "".join(parts)
+                end = last_boundary(text)
+                if end and end >= first_chunk:
+                    sent = text[:end].strip()
+                    on_first_chunk(sent)
+
+            if length >= soft_chars:
+                text = "".join(parts)
+                end = next_boundary(text, soft_chars)
+                if end:
+                    parts, cut = [text[:end]], True
+                    break
+            if length >= char_budget:
+                text = "".join(parts)
+                end = last_boundary(text[:char_budget])
+                parts, cut = [text[:end] if end else text[:char_budget].rstrip() + "…"], True
+                break
+    finally:
+        # Closing the response aborts generation upstream, so the cut tokens are never produced
+        stream.close()
+    return StreamedReply("".join(parts).strip(), cut, usage, sent, length)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+# No snapshot file, watcher thread or conversation log from a test run
+os.environ.setdefault("CATALOG_SNAPSHOT_FILE", "")
+os.environ.setdefault("CATALOG_POLL_INTERVAL", "0")
+os.environ["CONVERSATION_LOG"] = ""
@@ -0,0 +1,80 @@
+import pytest
+
+from basket import Basket, parse_basket, parse_delivery_policy
+from catalog_index import CatalogIndex
+from fuzzy_search import FuzzySearch
+
+CATALOG = {
+    "poultry": [
+        {"name": "Chicken Breast", "price": "£9.99"},
+        {"name": "Chicken Wings 3 Joint", "price": "£5.99"},
+        {"name": "Chicken Liver (1Kg)", "price": "£5.99"},
+    ],
+    "lamb": [
+        {"name": "Lamb Liver", "price": "£5.99"},
+        {"name": "Boneless Mutton", "price": "£16.99"},
+        {"name": "Lamb Shanks", "price": "£14.99 (Out of stock)"},
+    ],
+    "marinated meats": [
+        {"name": "Mumtaz Lamb Chops 1kg", "price": "£24.99"},
+        {"name": "Truffle Lamb Chops (1kg)", "price": "£24.99"},
+    ],
+}
+POLICY = "Orders under £100: £9.99 delivery fee. Orders £100+: Free delivery."
+
+
+@pytest.fixture(scope="module")
+def basket():
+    return Basket(FuzzySearch(CATALOG), POLICY, CatalogIndex(CATALOG))
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("price of chicken breast and lamb shanks", [(1, "chicken breast"), (1, "lamb shanks")]),
+    ("2 chicken breast, three boneless mutton please", [(2, "chicken breast"), (3, "boneless mutton")]),
+    ("chicken wings x4", [(4, "chicken wings")]),
+    ("i want 500 chicken breast", [(50, "chicken breast")]),
+])
+def test_parse_basket(message, expected):
+    assert parse_basket(message) == expected
+
+
+@pytest.mark.parametrize("message", ["chicken breast", "what are your opening hours and do you deliver to leeds today"])
+def test_parse_basket_rejects_non_baskets(message):
+    assert parse_basket(message) is None
+
+
+def test_parse_delivery_policy():
+    assert parse_delivery_policy(POLICY) == (10000, 999)
+
+
+def test_total_and_delivery(basket):
+    reply = basket.answer("2 chicken breast and 1 boneless mutton")
+    assert "• 2 × Chicken Breast (Poultry): £9.99 each = £19.98" in reply
+    assert "Total: £36.97" in reply
+    assert "Add £63.03 more for free delivery" in reply
+
+
+def test_free_delivery_over_threshold(basket):
+    assert "Free delivery" in basket.answer("10 boneless mutton")
+
+
+def test_out_of_stock_line_is_not_totalled(basket):
+    reply = basket.answer("chicken breast and lamb shanks")
+    assert "Lamb Shanks (Lamb): £14.99 (Out of stock)" in reply
+    assert "Total: £9.99" in reply
+
+
+def test_tied_matches_ask_did_you_mean(basket):
+    reply = basket.answer("chicken breast and lamb chops")
+    assert "❓ lamb chops: did you mean" in reply
+    assert "Mumtaz Lamb Chops 1kg" in reply and "Truffle Lamb Chops (1kg)" in reply
+    assert "Total: £9.99" in reply
+
+
+def test_aliases_resolve_before_fuzzy_matching(basket):
+    reply = basket.answer("chicken breast and kalegi")
+    assert "❓ kalegi: did you mean Chicken Liver (1Kg) or Lamb Liver?" in reply
+
+
+def test_categories_are_not_baskets(basket):
+    assert basket.answer("poultry and lamb") is None
@@ -0,0 +1,58 @@
+import pytest
+
+from catalog_model import Catalog, format_pence, parse_price
+
+RAW = {
+    "poultry": [
+        {"name": "Chicken Breast", "price": "£9.99"},
+        {"name": "Chicken Wings", "price": "£5.5"},
+        {"name": "Chicken Liver", "price": "£4.99 (Out of stock)"},
+    ],
+    "marinated meats": {
+        "Lamb": {"Mumtaz Lamb Chops": "£24.99"},
+        "Chicken": {"Tandoori Chicken": "£7.49"},
+    },
+}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("£9.99", (999, True)),
+    ("£ 12", (1200, True)),
+    ("£5.5", (550, True)),
+    ("£14.99 (Out of stock)", (1499, False)),
+    ("Ask in store", (None, True)),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+
+def test_format_pence():
+    assert format_pence(999) == "£9.99" and format_pence(1200) == "£12.00"
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return Catalog(RAW)
+
+
+def test_nested_categories_are_flattened(catalog):
+    assert [p.label() for p in catalog.categories["marinated meats"]] == ["Marinated Meats / Lamb", "Marinated Meats / Chicken"]
+
+
+def test_under_bound_skips_out_of_stock(catalog):
+    reply = catalog.answer("chicken under £8")
+    assert reply.splitlines()[0] == "🛒 Chicken under £8.00:"
+    assert "Chicken Wings" in reply and "Tandoori Chicken" in reply
+    assert "Chicken Liver" not in reply and "Chicken Breast" not in reply
+
+
+def test_cheapest(catalog):
+    assert catalog.answer("cheapest chicken?").splitlines()[1].startswith("• Chicken Wings")
+
+
+def test_out_of_stock(catalog):
+    assert "Chicken Liver" in catalog.answer("what chicken is out of stock")
+
+
+def test_unknown_term_is_left_to_other_routes(catalog):
+    assert catalog.answer("goat under 10") is None
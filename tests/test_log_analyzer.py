@@ -0,0 +1,24 @@
+import pytest
+
+from log_analyzer import Cluster, catalog_vocabulary, suggest
+
+
+@pytest.fixture(scope="module")
+def vocabulary():
+    return catalog_vocabulary()
+
+
+def cluster(body):
+    c = Cluster(body.lower())
+    c.examples[body] += 1
+    return c
+
+
+@pytest.mark.parametrize("body", ["do you deliver to jersey", "refund policy", "what is your refund policy"])
+def test_questions_are_intent_candidates(vocabulary, body):
+    assert suggest(cluster(body), vocabulary) == ("intent", None)
+
+
+@pytest.mark.parametrize("body, nearest", [("mutten", "mutton"), ("lamb paye", None), ("do you have kalegi", None)])
+def test_unknown_product_words_are_alias_candidates(vocabulary, body, nearest):
+    assert suggest(cluster(body), vocabulary) == ("alias", nearest)
@@ -0,0 +1,79 @@
+"""Which route answers a message: catalog lookups must not swallow questions meant for the LLM."""
+import re
+import types
+
+import pytest
+
+import cmvprun
+
+
+def route(message):
+    return cmvprun.route_message(message, {})[0]
+
+
+@pytest.mark.parametrize("message", [
+    "is your meat halal",
+    "is your beef halal",
+    "is it halal",
+    "do you have halal meat?",
+])
+def test_certification_questions_reach_the_llm(message):
+    assert route(message) is None
+
+
+@pytest.mark.parametrize("message", ["kaleji", "do you have kaleji", "do you sell paya", "any qeema?"])
+def test_aliases_still_resolve(message):
+    assert route(message) == "alias"
+
+
+@pytest.mark.parametrize("message", ["thanks", "Thanks!", "thanks."])
+def test_thanks_is_not_a_product_search(message):
+    assert route(message) is None
+
+
+@pytest.mark.parametrize("message", ["tandori", "chikken", "lamb chop"])
+def test_misspelt_products_still_match(message):
+    assert route(message) is not None
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(cmvprun, "RequestValidator", lambda token: types.SimpleNamespace(validate=lambda *a: True))
+    return cmvprun.app.test_client()
+
+
+def post(app, body, sender="whatsapp:+447000000201"):
+    response = app.post("/whatsapp", data={"Body": body, "From": sender})
+    assert response.status_code == 200
+    return re.findall(r"<Message>(.*?)</Message>", response.get_data(as_text=True), re.S)
+
+
+@pytest.mark.parametrize("body", ["Thanks!", "thanks.", "Thank you!!"])
+def test_punctuated_goodbye_gets_goodbye(app, body):
+    assert post(app, body)[0].startswith("Goodbye")
+
+
+@pytest.mark.parametrize("body", ["No.", "yes!"])
+def test_punctuated_feedback_is_acknowledged(app, body):
+    assert post(app, body) == ["Thanks for your feedback!"]
+
+
+@pytest.mark.parametrize("message", ["No.", "no", "ok", "k"])
+def test_chat_replies_are_not_product_searches(message):
+    assert route(message) is None
+
+
+@pytest.mark.parametrize("message", [
+    "HA9",
+    "any stores near HA9?",
+    "do you have a shop near E17",
+    "store near ig1",
+    "I live in HA9, which branch is closest",
+])
+def test_outcode_with_store_words_finds_nearest_branch(message):
+    assert route(message) == "postcode"
+
+
+@pytest.mark.parametrize("message", ["do you deliver to HA9", "what are your store hours"])
+def test_store_words_without_outcode_keep_their_intent(message):
+    assert route(message) in ("delivery", "hours")
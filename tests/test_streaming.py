@@ -0,0 +1,118 @@
+"""Streaming replies against bench/fake_openai.py, a local SSE stand-in for the OpenAI API."""
+import re
+import time
+import types
+
+import pytest
+from openai import OpenAI
+
+import fake_openai
+from async_replies import ReplyWorkerPool, StubSender
+from streaming import SENTENCE_END_RE, consume_stream
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = fake_openai.start(first_token=0.01, token_delay=0.001, words=400)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    return OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+
+def open_stream(client, max_tokens=400):
+    return client.chat.completions.create(
+        model="gpt-4", messages=[{"role": "user", "content": "tell me about your meat"}],
+        max_tokens=max_tokens, stream=True, stream_options={"include_usage": True},
+    )
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_cut_at_sentence_after_soft_limit(client, server):
+    closed = server.stats["streams_closed_early"]
+    reply = consume_stream(open_stream(client), char_budget=900, soft_chars=300, first_chunk=0)
+    assert reply.cut
+    assert 300 <= len(reply.text) <= 900
+    assert reply.text.endswith(".")
+    assert reply.usage is None
+    assert reply.received_chars >= len(reply.text)
+    # Closing the response stops generation upstream
+    assert wait_for(lambda: server.stats["streams_closed_early"] > closed)
+
+
+def test_hard_budget_ends_at_last_sentence(client):
+    reply = consume_stream(open_stream(client), char_budget=250, soft_chars=10_000, first_chunk=0)
+    assert reply.cut
+    assert len(reply.text) <= 250
+    assert SENTENCE_END_RE.search(reply.text + " ")
+
+
+def test_short_stream_runs_to_end_with_usage(client):
+    reply = consume_stream(open_stream(client, max_tokens=20), char_budget=900, soft_chars=600, first_chunk=0)
+    assert not reply.cut
+    assert reply.usage.completion_tokens == 20
+
+
+def test_first_chunk_is_whole_sentences_and_prefixes_reply(client):
+    sent = []
+    reply = consume_stream(open_stream(client), char_budget=900, soft_chars=600, first_chunk=160,
+                           on_first_chunk=sent.append)
+    assert len(sent) == 1
+    assert len(sent[0]) >= 160 and sent[0].endswith(".")
+    assert reply.first_chunk == sent[0]
+    assert reply.text.startswith(sent[0])
+
+
+def test_no_first_chunk_without_callback(client):
+    reply = consume_stream(open_stream(client), first_chunk=160)
+    assert reply.first_chunk is None
+
+
+@pytest.fixture
+def app(server, monkeypatch):
+    import cmvprun
+    monkeypatch.setattr(cmvprun, "STREAM_REPLIES", True)
+    monkeypatch.setattr(cmvprun, "client", OpenAI(api_key="test", base_url=server.base_url, max_retries=0))
+    monkeypatch.setattr(cmvprun, "RequestValidator", lambda token: types.SimpleNamespace(validate=lambda *a: True))
+    monkeypatch.setattr(cmvprun, "time", types.SimpleNamespace(**{**vars(time), "sleep": lambda s: None}))
+    cmvprun.ANSWER_CACHE.entries.clear()
+    return cmvprun
+
+
+def post(cmvprun, body, sender):
+    response = cmvprun.app.test_client().post("/whatsapp", data={"Body": body, "From": sender})
+    assert response.status_code == 200
+    return re.findall(r"<Message>(.*?)</Message>", response.get_data(as_text=True), re.S)
+
+
+def prompt_tokens(cmvprun):
+    return sum(value for (model, kind), value in cmvprun.LLM_TOKENS.values.items() if kind == "prompt")
+
+
+def test_sync_reply_is_cut_and_usage_estimated(app):
+    before = prompt_tokens(app)
+    messages = post(app, "tell me a long story about halal meat", "whatsapp:+447000000101")
+    assert len(messages) == 1
+    assert len(messages[0]) <= 900
+    assert prompt_tokens(app) > before
+
+
+def test_async_sends_first_chunk_then_rest(app, monkeypatch):
+    sender = StubSender()
+    pool = ReplyWorkerPool(app.deliver_reply, sender, fallback=app.fallback_reply, workers=1)
+    monkeypatch.setattr(app, "REPLY_POOL", pool)
+    assert post(app, "write me a long essay about lamb farming", "whatsapp:+447000000102") == []
+    pool.join()
+    bodies = [m["body"] for m in sender.sent]
+    assert len(bodies) == 2
+    assert len(bodies[0]) >= 160 and bodies[0].endswith(".")
+    assert len(bodies[0]) + len(bodies[1]) <= 900